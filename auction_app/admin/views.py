@@ -1,16 +1,26 @@
 from sqladmin import ModelView
 from auction_app.db.models import (UserProfile, Brand, Model,
                                    Car, CarImage, Auction, Bid, Feedback)
+from auction_app.services import catalog
+
+
+class CatalogAdmin(ModelView):
+    # brand/model edits only happen here, so this is where the cache is dropped
+    async def after_model_change(self, data, model, is_created, request):
+        await catalog.invalidate()
+
+    async def after_model_delete(self, model, request):
+        await catalog.invalidate()
 
 
 class UserProfileAdmin(ModelView, model=UserProfile):
     column_list = [UserProfile.id, UserProfile.first_name, UserProfile.last_name, UserProfile.username]
 
 
-class BrandAdmin(ModelView, model=Brand):
+class BrandAdmin(CatalogAdmin, model=Brand):
     column_list = [Brand.id, Brand.brand_name]
 
 
-class ModelAdmin(ModelView, model=Model):
+class ModelAdmin(CatalogAdmin, model=Model):
     column_list = [Model.id, Model.model_name, Model.brand_id]
 
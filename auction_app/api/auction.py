@@ -1,69 +1,126 @@
 from auction_app.db.models import Auction, Car
-from auction_app.db.schema import AuctionSchema, AuctionGetSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from auction_app.db.schema import AuctionSchema, AuctionGetSchema, LeaderboardSchema, CursorPage
+from auction_app.db.database import get_db, AsyncSessionLocal
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.db.streaming import ndjson_response
+from auction_app.services import order_book, live_feed, response_cache
+from auction_app.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
 
 
 auction_router = APIRouter(prefix='/auction', tags=['Auctions'])
 
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+AUCTION_COLUMNS = (Auction.id, Auction.car_id, Auction.start_price, Auction.min_price,
+                   Auction.start_time, Auction.end_time, Auction.status, Auction.current_price,
+                   Auction.current_winner_id, Auction.winner_id)
 
 
 @auction_router.post('/', response_model=AuctionSchema)
-async def auction_create(auction: AuctionSchema, db: Session = Depends(get_db)):
-    car_db = db.query(Car).filter(Car.id == auction.car_id).first()
+async def auction_create(auction: AuctionSchema, db: AsyncSession = Depends(get_db)):
+    car_db = await db.get(Car, auction.car_id)
     if not car_db:
         raise HTTPException(status_code=404, detail='Car not found')
 
     auction_db = Auction(**auction.dict())
     db.add(auction_db)
-    db.commit()
-    db.refresh(auction_db)
+    await db.commit()
+    await db.refresh(auction_db)
     return auction_db
 
 
-@auction_router.get('/', response_model=List[AuctionGetSchema])
-async def auction_list(db: Session = Depends(get_db)):
-    return db.query(Auction).all()
+@auction_router.get('/', response_model=CursorPage[AuctionGetSchema])
+async def auction_list(db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                       limit: int = Depends(page_size)):
+    result = await db.execute(keyset(select(*AUCTION_COLUMNS), [Auction.id], cursor, limit))
+    return ORJSONResponse(make_page(result.all(), [Auction.id], limit))
+
+
+@auction_router.get('/stream/')
+async def auction_stream(after_id: Optional[int] = None):
+    query = select(*AUCTION_COLUMNS).order_by(Auction.id)
+    if after_id is not None:
+        query = query.where(Auction.id > after_id)
+    return ndjson_response(query)
 
 
 @auction_router.get('/{auction_id}/', response_model=AuctionSchema)
-async def auction_detail(auction_id: int, db: Session = Depends(get_db)):
-    auction_db = db.query(Auction).filter(Auction.id == auction_id).first()
-    if not auction_db:
+async def auction_detail(auction_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    key = response_cache.auction_key(auction_id)
+    entry = await response_cache.cached(key)
+    if entry is None:
+        auction_db = await db.get(Auction, auction_id)
+        if not auction_db:
+            raise HTTPException(status_code=404, detail='Auction not found')
+        seconds, cache_control = response_cache.auction_policy(auction_db.status)
+        body = AuctionSchema.model_validate(auction_db).model_dump(mode='json')
+        etag = response_cache.etag('auction', auction_id, auction_db.version)
+        entry = await response_cache.store(key, auction_db.version, etag, ORJSONResponse(body).body,
+                                           cache_control, seconds)
+    return response_cache.respond(request, entry)
+
+
+@auction_router.get('/{auction_id}/leaderboard/', response_model=LeaderboardSchema)
+async def auction_leaderboard(auction_id: int, db: AsyncSession = Depends(get_db)):
+    return await order_book.leaderboard(db, auction_id)
+
+
+async def auction_exists(auction_id: int):
+    # live connections outlast requests, so don't keep a pooled session open for them
+    async with AsyncSessionLocal() as db:
+        return await db.get(Auction, auction_id) is not None
+
+
+@auction_router.websocket('/{auction_id}/live')
+async def auction_live(websocket: WebSocket, auction_id: int):
+    if not await auction_exists(auction_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await live_feed.stream_to_websocket(websocket, auction_id)
+
+
+@auction_router.get('/{auction_id}/live/sse')
+async def auction_live_sse(auction_id: int):
+    if not await auction_exists(auction_id):
         raise HTTPException(status_code=404, detail='Auction not found')
-    return auction_db
+
+    return StreamingResponse(live_feed.stream_events(auction_id), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @auction_router.put('/{auction_id}/', response_model=AuctionSchema)
-async def auction_update(auction_id: int, auction: AuctionSchema, db: Session = Depends(get_db)):
-    auction_db = db.query(Auction).filter(Auction.id == auction_id).first()
+async def auction_update(auction_id: int, auction: AuctionSchema, db: AsyncSession = Depends(get_db)):
+    auction_db = await db.get(Auction, auction_id)
     if not auction_db:
         raise HTTPException(status_code=404, detail='Car not found')
 
+    old_status = auction_db.status
     for auction_key, auction_value in auction.dict().items():
         setattr(auction_db, auction_key, auction_value)
 
     db.add(auction_db)
-    db.commit()
-    db.refresh(auction_db)
+    await db.commit()
+    await db.refresh(auction_db)
+    await order_book.forget(auction_id)
+    await response_cache.forget_auctions([auction_id])
+    if auction_db.status != old_status:
+        await live_feed.publish(auction_id, {'type': 'status', 'status': auction_db.status.value})
     return auction_db
 
 
 @auction_router.delete('/{auction_id}/')
-async def auction_delete(auction_id: int, db: Session = Depends(get_db)):
-    auction_db = db.query(Auction).filter(Auction.id == auction_id).first()
+async def auction_delete(auction_id: int, db: AsyncSession = Depends(get_db)):
+    auction_db = await db.get(Auction, auction_id)
     if not auction_db:
         raise HTTPException(status_code=404, detail='Auction not found')
 
-    db.delete(auction_db)
-    db.commit()
+    await db.delete(auction_db)
+    await db.commit()
+    await order_book.forget(auction_id)
+    await response_cache.forget_auctions([auction_id])
     return {'message': 'Deleted'}
@@ -1,60 +1,102 @@
-from auction_app.db.database import SessionLocal
-from auction_app.db.schema import UserProfileSchema, LoginSchema
+from auction_app.db.database import get_db
+from auction_app.db.schema import UserProfileSchema, LoginSchema, CurrentUserSchema
 from auction_app.db.models import UserProfile, RefreshToken
+from auction_app.services.password_pool import password_pool
+from auction_app.services.cache import TTLCache
+from auction_app.services import refresh_tokens
 from fastapi import Depends, HTTPException, APIRouter
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from datetime import timedelta, datetime
-from fastapi_limiter.depends import RateLimiter
 from auction_app.config import SECRET_KEY, REFRESH_EXPIRE_DAYS, ALGORITHM, ACCESS_EXPIRE_MINUTES
-from jose import jwt
+from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
+import hashlib
+import time
+import uuid
 
 auth_router = APIRouter(prefix='/auth', tags=['Authorization'])
 
 oauth2_schema = OAuth2PasswordBearer(tokenUrl='/auth/login/')
 password_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
+USER_CACHE_SIZE = 10_000
+USER_CACHE_SECONDS = 60
+# sha256 of the access token -> CurrentUserSchema
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_SECONDS)
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+# the type claim keeps the two kinds of token from standing in for each other
+def _create_token(data: dict, expires_delta: timedelta, token_type: str):
+    now = datetime.utcnow()
+    to_encode = {**data, 'type': token_type, 'iat': now, 'exp': now + expires_delta}
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_EXPIRE_MINUTES))
-    to_encode.update({'exp': expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return _create_token(data, expires_delta or timedelta(minutes=ACCESS_EXPIRE_MINUTES), 'access')
 
 
 def create_refresh_token(data: dict):
-    return create_access_token(data, expires_delta=timedelta(days=REFRESH_EXPIRE_DAYS))
+    # jti keeps two logins within the same second from sharing a token hash
+    return _create_token({**data, 'jti': uuid.uuid4().hex}, timedelta(days=REFRESH_EXPIRE_DAYS), 'refresh')
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def invalidate_user(user_id: int):
+    user_cache.drop_where(lambda user: user.id == user_id)
 
 
-def verify_password(plain_password, hash_password):
-    return password_context.verify(plain_password, hash_password)
+async def get_current_user(token: str = Depends(oauth2_schema),
+                           db: AsyncSession = Depends(get_db)) -> CurrentUserSchema:
+    key = token_hash(token)
+    user = user_cache.get(key)
+    if user is not None:
+        return user
+
+    credentials_error = HTTPException(status_code=401, detail='Could not validate credentials',
+                                      headers={'WWW-Authenticate': 'Bearer'})
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_error
+    if payload.get('type') != 'access':
+        raise credentials_error
+
+    user_db = await db.scalar(select(UserProfile).where(UserProfile.username == payload.get('sub')))
+    if not user_db:
+        raise credentials_error
+
+    user = CurrentUserSchema.model_validate(user_db)
+    # never serve a token from the cache past its own expiry
+    user_cache.set(key, user, ttl=min(USER_CACHE_SECONDS, payload['exp'] - time.time()))
+    return user
 
 
-def get_password_hash(password):
-    return password_context.hash(password)
+async def verify_password(plain_password, hash_password):
+    return await password_pool.run(password_context.verify, plain_password, hash_password)
+
+
+async def get_password_hash(password):
+    return await password_pool.run(password_context.hash, password)
 
 
 @auth_router.post('/register/', response_model=UserProfileSchema)
-async def register(user_form: UserProfileSchema, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.username == user_form.username).first()
+async def register(user_form: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    user_db = await db.scalar(select(UserProfile).where(UserProfile.username == user_form.username))
     if user_db:
         raise HTTPException(status_code=404, detail='Username already exists')
 
-    email_db = db.query(UserProfile).filter(UserProfile.email == user_form.email).first()
+    email_db = await db.scalar(select(UserProfile).where(UserProfile.email == user_form.email))
     if email_db:
         raise HTTPException(status_code=404, detail='Email is busy')
 
-    hashed_password = get_password_hash(user_form.password)
+    hashed_password = await get_password_hash(user_form.password)
     new_user = UserProfile(
         username=user_form.username,
         first_name=user_form.first_name,
@@ -66,43 +108,63 @@ async def register(user_form: UserProfileSchema, db: Session = Depends(get_db)):
         password=hashed_password,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-@auth_router.post('/login/', response_model=dict, dependencies=[Depends(RateLimiter(times=3, seconds=5))])
-async def login(form: LoginSchema = Depends(), db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.email == form.email).first()
-    if not user_db or not verify_password(form.password, user_db.password):
+@auth_router.post('/login/', response_model=dict)
+async def login(form: LoginSchema = Depends(), db: AsyncSession = Depends(get_db)):
+    user_db = await db.scalar(select(UserProfile).where(UserProfile.email == form.email))
+    if not user_db or not await verify_password(form.password, user_db.password):
         raise HTTPException(status_code=404, detail='Wrong data')
 
     access_token = create_access_token({'sub': user_db.username})
     refresh_token = create_refresh_token({'sub': user_db.username})
-    refresh_db = RefreshToken(token=refresh_token, user_id=user_db.id)
+    refresh_db = RefreshToken(token_hash=token_hash(refresh_token), user_id=user_db.id,
+                              expires_at=datetime.utcnow() + timedelta(days=REFRESH_EXPIRE_DAYS))
     db.add(refresh_db)
-    db.commit()
-    db.refresh(refresh_db)
+    await db.commit()
     return {'access': access_token, 'refresh': refresh_token, 'type': 'bearer'}
 
 
 @auth_router.post('/logout/', response_model=dict)
-async def logout(token: str, db: Session = Depends(get_db)):
-    token_db = db.query(RefreshToken).filter(RefreshToken.token == token).first()
+async def logout(token: str, db: AsyncSession = Depends(get_db)):
+    key = token_hash(token)
+    result = await db.execute(delete(RefreshToken).where(RefreshToken.token_hash == key)
+                              .returning(RefreshToken.user_id, RefreshToken.expires_at))
+    token_db = result.first()
     if not token_db:
         raise HTTPException(status_code=404, detail='Token not found')
 
-    db.delete(token_db)
-    db.commit()
+    # revoke before committing, a logout that can't reach redis must fail whole
+    await refresh_tokens.revoke(key, token_db.expires_at)
+    await db.commit()
+    invalidate_user(token_db.user_id)
     return {'message': 'Logged out'}
 
 
 @auth_router.post('/refresh/')
-async def refresh(refresh_token: str, db: Session = Depends(get_db)):
-    token_db = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-    if not token_db:
+async def refresh(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    # signature and expiry are checked locally, revocation in redis; postgres
+    # is only asked when redis is down or may have lost the token's mark
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail='Token expired or invalid')
+    # only login hands out refresh tokens, so the revocation check below
+    # covers every token that gets this far
+    if payload.get('type') != 'refresh':
+        raise HTTPException(status_code=401, detail='Token expired or invalid')
+
+    key = token_hash(refresh_token)
+    # tokens from before the iat claim always go to postgres
+    revoked = await refresh_tokens.is_revoked(key, payload.get('iat', 0))
+    if revoked is None:
+        revoked = not await db.scalar(select(RefreshToken.id).where(RefreshToken.token_hash == key))
+    if revoked:
         raise HTTPException(status_code=404, detail='Token not found')
 
-    access_token = create_access_token({'sub': token_db.user_id})
+    access_token = create_access_token({'sub': payload['sub']})
 
     return {'access_token': access_token, 'token_type': 'bearer'}
@@ -1,38 +1,40 @@
-from auction_app.db.models import Bid, Auction, UserProfile
-from auction_app.db.schema import BidSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from auction_app.db.models import Bid
+from auction_app.db.schema import BidSchema, BidCreateSchema, CurrentUserSchema, CursorPage
+from auction_app.db.database import get_db
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.db.streaming import ndjson_response
+from auction_app.services.bidding import place_bid
+from auction_app.services import rate_limit
+from auction_app.api.auth import get_current_user
+from auction_app.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from fastapi import APIRouter, Depends
 
 bid_router = APIRouter(prefix='/bid', tags=['Bids'])
 
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+BID_COLUMNS = (Bid.id, Bid.auction_id, Bid.buyer_id, Bid.amount, Bid.created_date)
 
 
 @bid_router.post('/', response_model=BidSchema)
-async def bid_create(bid: BidSchema, db: Session = Depends(get_db)):
-    auction_db = db.query(Auction).filter(Auction.id == bid.auction_id).first()
-    if not auction_db:
-        raise HTTPException(status_code=404, detail='Seller not found')
-
-    buyer_db = db.query(UserProfile).filter(UserProfile.id == bid.buyer_id).first()
-    if not buyer_db:
-        raise HTTPException(status_code=404, detail='Buyer not found')
-
-    bid_db = Bid(**bid.dict())
-    db.add(bid_db)
-    db.commit()
-    db.refresh(bid_db)
-    return bid_db
-
-
-@bid_router.get('/', response_model=List[BidSchema])
-async def bid_list(db: Session = Depends(get_db)):
-    return db.query(Bid).all()
+async def bid_create(bid: BidCreateSchema, db: AsyncSession = Depends(get_db),
+                     current_user: CurrentUserSchema = Depends(get_current_user)):
+    await rate_limit.limit_bid(db, current_user.id, bid.auction_id)
+    return await place_bid(db, bid.auction_id, current_user.id, bid.amount)
+
+
+@bid_router.get('/', response_model=CursorPage[BidSchema])
+async def bid_list(db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                   limit: int = Depends(page_size)):
+    result = await db.execute(keyset(select(*BID_COLUMNS), [Bid.id], cursor, limit))
+    return ORJSONResponse(make_page(result.all(), [Bid.id], limit))
+
+
+# the whole table as NDJSON, rows leave as they come off a server side cursor
+@bid_router.get('/stream/')
+async def bid_stream(after_id: Optional[int] = None):
+    query = select(*BID_COLUMNS).order_by(Bid.id)
+    if after_id is not None:
+        query = query.where(Bid.id > after_id)
+    return ndjson_response(query)
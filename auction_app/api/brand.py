@@ -1,36 +1,46 @@
-from auction_app.db.models import Brand, Car
+from auction_app.db.models import Car
 from auction_app.db.schema import BrandSchema, BrandDetailSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi import Depends, HTTPException, APIRouter
+from auction_app.db.database import get_db
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.api.car import CAR_COLUMNS
+from auction_app.services import catalog
+from auction_app.services.http_cache import conditional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from fastapi import Depends, HTTPException, APIRouter, Request, Response
 
 brand_router = APIRouter(prefix='/brand', tags=['Brands'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @brand_router.get('/', response_model=List[BrandSchema])
-async def brand_list(db: Session = Depends(get_db)):
-    return db.query(Brand).all()
+async def brand_list(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    digest, brands = await catalog.brands(db)
+    not_modified = conditional(request, response, catalog.etag(digest, 'brands'), catalog.CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    return list(brands.values())
 
 
 @brand_router.get('/{brand_id}/', response_model=BrandDetailSchema)
-async def brand_detail(brand_id: int, db: Session = Depends(get_db)):
-    brand_db = db.query(Brand).filter(Brand.id == brand_id).first()
+async def brand_detail(brand_id: int, db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                       limit: int = Depends(page_size), counts_only: bool = False):
+    _, brands = await catalog.brands(db)
+    brand_db = brands.get(brand_id)
 
     if not brand_db:
         raise HTTPException(status_code=404, detail='Brand not found')
 
-    cars_db = db.query(Car).filter(Car.brand_id == brand_id).all()
+    if counts_only:
+        car_count = await db.scalar(select(func.count()).select_from(Car).where(Car.brand_id == brand_id))
+        return {'id': brand_db['id'], 'brand_name': brand_db['brand_name'], 'car_count': car_count}
+
+    cars_db = await db.execute(keyset(select(*CAR_COLUMNS).where(Car.brand_id == brand_id),
+                                      [Car.id], cursor, limit))
+    page = make_page(cars_db.all(), [Car.id], limit)
     return {
-        'id': brand_db.id,
-        'brand_name': brand_db.brand_name,
-        'brand_cars': cars_db,
+        'id': brand_db['id'],
+        'brand_name': brand_db['brand_name'],
+        'brand_cars': page['items'],
+        'next_cursor': page['next_cursor'],
     }
@@ -0,0 +1,230 @@
+import csv
+import io
+import json
+import tempfile
+from itertools import islice
+from auction_app.db.models import Car, CarImage, Auction, Model, UserProfile
+from auction_app.db.schema import CarSchema, CarImageSchema, AuctionSchema
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.streaming import (ndjson_line, ndjson_response, csv_response,
+                                      NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE)
+from auction_app.api.car import CAR_COLUMNS
+from auction_app.api.car_image import IMAGE_COLUMNS
+from auction_app.api.auction import AUCTION_COLUMNS
+from auction_app.services import car_facets, response_cache
+from auction_app.config import MAX_IMPORT_BYTES
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError, DataError, DBAPIError
+from pydantic import ValidationError
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+
+bulk_router = APIRouter(prefix='/bulk', tags=['Bulk'])
+
+IMPORT_CHUNK_SIZE = 500
+# uploads bigger than this go to a temp file instead of memory
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+async def _spool(request: Request):
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    if content_type not in (NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE):
+        raise HTTPException(status_code=415, detail=f'Send {NDJSON_MEDIA_TYPE} or {CSV_MEDIA_TYPE}')
+
+    # the body is read up front: the response streams while we'd still be
+    # reading it otherwise, and starlette reads receive() for disconnects then
+    if int(request.headers.get('content-length') or 0) > MAX_IMPORT_BYTES:
+        raise HTTPException(status_code=413, detail='Upload is too large')
+    upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    size = 0
+    try:
+        async for data in request.stream():
+            size += len(data)
+            if size > MAX_IMPORT_BYTES:
+                raise HTTPException(status_code=413, detail='Upload is too large')
+            # past SPOOL_MAX_MEMORY this is a disk write, keep it off the loop
+            await run_in_threadpool(upload.write, data)
+    except BaseException:
+        upload.close()
+        raise
+    upload.seek(0)
+    return content_type, io.TextIOWrapper(upload, encoding='utf-8', errors='replace', newline='')
+
+
+def _records(content_type: str, text):
+    if content_type == CSV_MEDIA_TYPE:
+        for row, record in enumerate(csv.DictReader(text), 1):
+            if None in record:
+                yield row, None, 'Too many columns'
+            else:
+                yield row, {key: value or None for key, value in record.items()}, None
+        return
+
+    for row, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row, None, 'Invalid JSON'
+            continue
+        if isinstance(record, dict):
+            yield row, record, None
+        else:
+            yield row, None, 'Expected a JSON object'
+
+
+def _error(exc: ValidationError) -> str:
+    return '; '.join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors())
+
+
+def _db_error(exc: DBAPIError) -> str:
+    if isinstance(exc, IntegrityError):
+        return 'Referenced row was removed'
+    if isinstance(exc, DataError):
+        return 'Value does not fit its column'
+    return 'Rejected by the database'
+
+
+async def _existing(db, column, ids: set) -> set:
+    if not ids:
+        return set()
+    result = await db.scalars(select(column).where(column.in_(ids)))
+    return set(result.all())
+
+
+async def _check_cars(db, cars: list) -> list:
+    sellers = await _existing(db, UserProfile.id, {car.seller_id for car in cars})
+    models = await db.execute(select(Model.id, Model.brand_id)
+                              .where(Model.id.in_({car.model_id for car in cars})))
+    brand_of = dict(models.all())
+
+    errors = []
+    for car in cars:
+        if car.seller_id not in sellers:
+            errors.append('Seller not found')
+        elif brand_of.get(car.model_id) != car.brand_id:
+            errors.append('Brand or model does not match')
+        else:
+            errors.append(None)
+    return errors
+
+
+async def _check_cars_exist(db, items: list) -> list:
+    cars = await _existing(db, Car.id, {item.car_id for item in items})
+    return [None if item.car_id in cars else 'Car not found' for item in items]
+
+
+async def _import(db, model, schema, check, chunk: list):
+    results = {}
+    valid = []
+    for row, record, error in chunk:
+        if error is None:
+            try:
+                valid.append((row, schema(**record)))
+                continue
+            except ValidationError as exc:
+                error = _error(exc)
+        results[row] = {'row': row, 'status': 'error', 'detail': error}
+
+    # one query per foreign key for the whole chunk, not one per row
+    errors = await check(db, [item for _, item in valid]) if valid else []
+    for (row, _), error in zip(valid, errors):
+        if error:
+            results[row] = {'row': row, 'status': 'error', 'detail': error}
+    valid = [(row, item) for (row, item), error in zip(valid, errors) if not error]
+
+    inserted = []
+    if valid:
+        try:
+            ids = await db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True),
+                                   [item.dict() for _, item in valid])
+            ids = ids.all()
+            await db.commit()
+        except DBAPIError:
+            # some row broke a constraint or overflowed a column; the chunk is
+            # rolled back and retried row by row to tell which
+            await db.rollback()
+            created = []
+            for row, item in valid:
+                try:
+                    new_id = await db.scalar(insert(model).values(**item.dict()).returning(model.id))
+                    await db.commit()
+                except DBAPIError as exc:
+                    await db.rollback()
+                    results[row] = {'row': row, 'status': 'error', 'detail': _db_error(exc)}
+                else:
+                    created.append(((row, item), new_id))
+        else:
+            created = zip(valid, ids)
+
+        for (row, item), new_id in created:
+            results[row] = {'row': row, 'status': 'created', 'id': new_id}
+            inserted.append(item)
+
+    return [results[row] for row, _, _ in chunk], inserted
+
+
+async def _import_response(request: Request, model, schema, check, after=None):
+    content_type, text = await _spool(request)
+
+    async def results():
+        try:
+            records = _records(content_type, text)
+            async with AsyncSessionLocal() as db:
+                while chunk := list(islice(records, IMPORT_CHUNK_SIZE)):
+                    lines, inserted = await _import(db, model, schema, check, chunk)
+                    if after and inserted:
+                        await after(inserted)
+                    yield b''.join(ndjson_line(line) for line in lines)
+        finally:
+            text.close()
+
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def _images_added(items: list):
+    # new images change the cars' detail responses
+    car_ids = [item.car_id for item in items]
+    async with AsyncSessionLocal() as db:
+        await response_cache.touch_cars(db, car_ids)
+        await db.commit()
+    await response_cache.forget_cars(car_ids)
+
+
+def _export_response(query, format: str):
+    if format == 'csv':
+        return csv_response(query)
+    return ndjson_response(query)
+
+
+@bulk_router.post('/car/')
+async def car_import(request: Request):
+    return await _import_response(request, Car, CarSchema, _check_cars, after=car_facets.added)
+
+
+@bulk_router.post('/car_image/')
+async def car_image_import(request: Request):
+    return await _import_response(request, CarImage, CarImageSchema, _check_cars_exist, after=_images_added)
+
+
+@bulk_router.post('/auction/')
+async def auction_import(request: Request):
+    return await _import_response(request, Auction, AuctionSchema, _check_cars_exist)
+
+
+@bulk_router.get('/car/')
+async def car_export(format: str = Query('ndjson', pattern='^(ndjson|csv)$')):
+    return _export_response(select(*CAR_COLUMNS).order_by(Car.id), format)
+
+
+@bulk_router.get('/car_image/')
+async def car_image_export(format: str = Query('ndjson', pattern='^(ndjson|csv)$')):
+    return _export_response(select(*IMAGE_COLUMNS).order_by(CarImage.id), format)
+
+
+@bulk_router.get('/auction/')
+async def auction_export(format: str = Query('ndjson', pattern='^(ndjson|csv)$')):
+    return _export_response(select(*AUCTION_COLUMNS).order_by(Auction.id), format)
@@ -1,122 +1,182 @@
-from tkinter.tix import IMAGE
-
-from auction_app.db.models import Car, UserProfile, Model, CarImage
-from auction_app.db.schema import CarSchema, CarGetSchema, CarImageSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from auction_app.db.models import Car, CarImage, Auction, UserProfile, FuelChoices, TransmissionChoices, SEARCH_CONFIG
+from auction_app.db.schema import CarSchema, CarGetSchema, CarSearchSchema, CursorPage
+from auction_app.db.database import get_db
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.services import catalog, car_facets, images, order_book, response_cache
+from auction_app.responses import ORJSONResponse
+from sqlalchemy import select, func, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import defaultdict
+from decimal import Decimal
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
 
 car_router = APIRouter(prefix='/car', tags=['Cars'])
 
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# plain columns for listings that don't need ORM objects
+CAR_COLUMNS = (Car.id, Car.brand_id, Car.model_id, Car.description, Car.fuel_type,
+               Car.transmission, Car.mileage, Car.price, Car.seller_id)
+SEARCH_SORTS = {'id': Car.id, 'price': Car.price, 'mileage': Car.mileage}
+HEADLINE_OPTIONS = 'StartSel=<b>, StopSel=</b>, MaxFragments=2, MaxWords=20, MinWords=5'
 
 
 @car_router.post('/', response_model=CarSchema)
-async def car_create(car: CarSchema, db: Session = Depends(get_db)):
-    seller_db = db.query(UserProfile).filter(UserProfile.id == car.seller_id).first()
+async def car_create(car: CarSchema, db: AsyncSession = Depends(get_db)):
+    seller_db = await db.get(UserProfile, car.seller_id)
     if not seller_db:
         raise HTTPException(status_code=404, detail='Seller not found')
 
-    brands_model = db.query(Model).filter(Model.id == car.model_id,
-                                          Model.brand_id == car.brand_id).first()
-    if not brands_model:
+    if not await catalog.model_matches_brand(db, car.model_id, car.brand_id):
         raise HTTPException(status_code=404, detail='Brand or model does not match')
 
     car_db = Car(**car.dict())
     db.add(car_db)
-    db.commit()
-    db.refresh(car_db)
+    await db.commit()
+    await db.refresh(car_db)
+    await car_facets.added([car_db])
     return car_db
 
 
-@car_router.get('/')
-async def car_list(db: Session = Depends(get_db), skip: int = 0, limit: int = 3):
-    cars_query = db.query(Car).offset(skip).limit(limit).all()
-
-    car_list = []
-    for car in cars_query:
-        image = db.query(CarImage).filter(CarImage.car_id == car.id).all()
-        car_list.append({
-            'id': car.id,
-            'brand_id': car.brand_id,
-            'model_id': car.model_id,
-            'description': car.description,
-            'fuel_type': car.fuel_type,
-            'transmission': car.transmission,
-            'mileage': car.mileage,
-            'price': car.price,
-            'seller_id': car.seller_id,
-            'image_url': [{"image": i.car_image} for i in image] if image else None
-        })
-
-    return {
-        'total': db.query(Car).count(),
-        'skip': skip,
-        'limit': limit,
-        'cars': car_list
-    }
-    # return db.query(Car).offset(skip).limit(limit).all()
+async def with_images(db: AsyncSession, cars: list) -> list:
+    # one query for the images of every car on the page
+    by_car = defaultdict(list)
+    if cars:
+        images_db = await db.execute(
+            select(CarImage.car_id, CarImage.car_image, CarImage.content_hash, CarImage.has_thumbnails)
+            .where(CarImage.car_id.in_([car.id for car in cars]))
+            .order_by(CarImage.id)
+        )
+        for car_id, car_image, content_hash, has_thumbnails in images_db:
+            by_car[car_id].append({'car_image': car_image,
+                                   'thumbnails': images.thumbnail_urls(content_hash, has_thumbnails)})
+    return [{**car._asdict(), 'image_url': by_car[car.id]} for car in cars]
+
+
+@car_router.get('/', response_model=CursorPage[CarGetSchema])
+async def car_list(db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                   limit: int = Depends(page_size), with_total: bool = False):
+    cars_db = await db.execute(keyset(select(*CAR_COLUMNS), [Car.id], cursor, limit))
+
+    total = None
+    if with_total:
+        total = await db.scalar(select(func.count()).select_from(Car))
+    page = make_page(cars_db.all(), [Car.id], limit, total)
+    page['items'] = await with_images(db, page['items'])
+    return ORJSONResponse(page)
+
+
+@car_router.get('/search/', response_model=CarSearchSchema)
+async def car_search(db: AsyncSession = Depends(get_db), brand_id: Optional[int] = None,
+                     model_id: Optional[int] = None, fuel_type: Optional[FuelChoices] = None,
+                     transmission: Optional[TransmissionChoices] = None,
+                     min_price: Optional[Decimal] = Query(None, ge=0), max_price: Optional[Decimal] = Query(None, ge=0),
+                     min_mileage: Optional[int] = Query(None, ge=0), max_mileage: Optional[int] = Query(None, ge=0),
+                     q: Optional[str] = Query(None, min_length=2, max_length=200),
+                     sort: Optional[str] = Query(None, pattern='^(-?(id|price|mileage)|relevance)$'),
+                     cursor: Optional[str] = None, limit: int = Depends(page_size), with_facets: bool = False):
+    filters = []
+    if brand_id is not None:
+        filters.append(Car.brand_id == brand_id)
+    if model_id is not None:
+        filters.append(Car.model_id == model_id)
+    if fuel_type is not None:
+        filters.append(Car.fuel_type == fuel_type)
+    if transmission is not None:
+        filters.append(Car.transmission == transmission)
+    if min_price is not None:
+        filters.append(Car.price >= min_price)
+    if max_price is not None:
+        filters.append(Car.price <= max_price)
+    if min_mileage is not None:
+        filters.append(Car.mileage >= min_mileage)
+    if max_mileage is not None:
+        filters.append(Car.mileage <= max_mileage)
+
+    columns = list(CAR_COLUMNS)
+    if q:
+        text_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        # served by the gin index, the other filters narrow its matches
+        filters.append(Car.search_vector.op('@@')(text_query))
+        rank = func.ts_rank_cd(Car.search_vector, text_query, type_=Float).label('rank')
+        # postgres only builds headlines for the rows that survive the limit
+        columns += [rank, func.ts_headline(SEARCH_CONFIG, Car.description, text_query,
+                                           HEADLINE_OPTIONS).label('snippet')]
+
+    sort = sort or ('relevance' if q else 'id')
+    if sort == 'relevance':
+        if not q:
+            raise HTTPException(status_code=400, detail='Sorting by relevance needs a search query')
+        keys, descending = [rank, Car.id], True
+    else:
+        # id breaks ties so the cursor stays stable on equal prices
+        keys, descending = [SEARCH_SORTS[sort.lstrip('-')]], sort.startswith('-')
+        if keys[0] is not Car.id:
+            keys.append(Car.id)
+
+    query = keyset(select(*columns).where(*filters), keys, cursor, limit, descending=descending)
+    cars_db = await db.execute(query)
+    page = make_page(cars_db.all(), keys, limit)
+    if with_facets:
+        page['facets'] = await car_facets.facets()
+    return ORJSONResponse(page)
 
 
 @car_router.get('/{car_id}/', response_model=CarGetSchema)
-async def car_detail(car_id: int, db: Session = Depends(get_db)):
-    car_db = db.query(Car).filter(Car.id == car_id).first()
-    if not car_db:
-        raise HTTPException(status_code=404, detail='Car not found')
-
-    images = db.query(CarImage).filter(CarImage.car_id == car_id).all()
-    return {
-        'id': car_db.id,
-        'brand_id': car_db.brand_id,
-        'model_id': car_db.model_id,
-        'description': car_db.description,
-        'fuel_type': car_db.fuel_type,
-        'transmission': car_db.transmission,
-        'mileage': car_db.mileage,
-        'price': car_db.price,
-        'seller_id': car_db.seller_id,
-        'image_url': images,
-    }
+async def car_detail(car_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    key = response_cache.car_key(car_id)
+    entry = await response_cache.cached(key)
+    if entry is None:
+        car_db = await db.execute(select(*CAR_COLUMNS, Car.version).where(Car.id == car_id))
+        car_db = car_db.first()
+        if not car_db:
+            raise HTTPException(status_code=404, detail='Car not found')
+        car, = await with_images(db, [car_db])
+        version = car.pop('version')
+        entry = await response_cache.store(key, version, response_cache.etag('car', car_id, version),
+                                           ORJSONResponse(car).body, response_cache.REVALIDATE,
+                                           response_cache.CAR_SECONDS)
+    return response_cache.respond(request, entry)
 
 
 @car_router.put('/{car_id}/', response_model=CarSchema)
-async def car_update(car_id: int, car: CarSchema, db: Session = Depends(get_db)):
-    car_db = db.query(Car).filter(Car.id == car_id).first()
+async def car_update(car_id: int, car: CarSchema, db: AsyncSession = Depends(get_db)):
+    car_db = await db.get(Car, car_id)
     if not car_db:
         raise HTTPException(status_code=404, detail='Car not found')
 
-    brand_model = db.query(Model).filter(Model.id == car.model_id,
-                                         Model.brand_id == car.brand_id).first()
-    if not brand_model:
+    if not await catalog.model_matches_brand(db, car.model_id, car.brand_id):
         raise HTTPException(status_code=404, detail='Brand or model does not match')
 
-    seller_db = db.query(UserProfile).filter(UserProfile.id == car.seller_id).first()
+    seller_db = await db.get(UserProfile, car.seller_id)
     if not seller_db:
         raise HTTPException(status_code=404, detail='Seller not found')
 
+    old_facets = car_facets.facet_fields(car_db)
     for car_key, car_value in car.dict().items():
         setattr(car_db, car_key, car_value)
 
     db.add(car_db)
-    db.commit()
-    db.refresh(car_db)
+    await db.commit()
+    await db.refresh(car_db)
+    await car_facets.moved(old_facets, car_db)
+    await response_cache.forget_cars([car_id])
     return car_db
 
 
 @car_router.delete('/{car_id}/')
-async def car_delete(car_id: int, db: Session = Depends(get_db)):
-    car_db = db.query(Car).filter(Car.id == car_id).first()
+async def car_delete(car_id: int, db: AsyncSession = Depends(get_db)):
+    car_db = await db.get(Car, car_id)
     if not car_db:
         raise HTTPException(status_code=404, detail='Car not found')
 
-    db.delete(car_db)
-    db.commit()
+    # its auctions go with it
+    auction_ids = await db.scalars(select(Auction.id).where(Auction.car_id == car_id))
+    auction_ids = auction_ids.all()
+    await db.delete(car_db)
+    await db.commit()
+    await car_facets.removed([car_db])
+    await order_book.forget(*auction_ids)
+    await response_cache.forget_cars([car_id])
+    await response_cache.forget_auctions(auction_ids)
     return {'message': 'Deleted'}
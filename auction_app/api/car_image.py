@@ -1,46 +1,108 @@
 from auction_app.db.models import CarImage, Car
-from auction_app.db.schema import CarImageSchema, CarImageGetSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from auction_app.db.schema import CarImageSchema, CarImageGetSchema, CarImageUploadSchema, CursorPage
+from auction_app.db.database import get_db
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.db.streaming import ndjson_response
+from auction_app.responses import ORJSONResponse
+from auction_app.services import images, response_cache
+from auction_app.config import MAX_IMAGE_BYTES
+from auction_app.services.storage import storage
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 
 image_router = APIRouter(prefix='/car_image', tags=['CarImages'])
 
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+IMAGE_COLUMNS = (CarImage.id, CarImage.car_image, CarImage.car_id, CarImage.content_hash, CarImage.has_thumbnails)
 
 
 @image_router.post('/', response_model=CarImageSchema)
-async def car_image_create(image: CarImageSchema, db: Session = Depends(get_db)):
-    car_db = db.query(Car).filter(Car.id == image.car_id).first()
+async def car_image_create(image: CarImageSchema, db: AsyncSession = Depends(get_db)):
+    car_db = await db.get(Car, image.car_id)
     if not car_db:
         raise HTTPException(status_code=404, detail='Car not found')
 
     image_db = CarImage(**image.dict())
     db.add(image_db)
-    db.commit()
-    db.refresh(image_db)
+    await response_cache.touch_cars(db, [image.car_id])
+    await db.commit()
+    await db.refresh(image_db)
+    await response_cache.forget_cars([image.car_id])
     return image_db
 
 
-@image_router.get('/', response_model=List[CarImageGetSchema])
-async def car_image_list(db: Session = Depends(get_db)):
-    return db.query(CarImage).all()
+# the raw request body is the file, e.g. Content-Type: image/jpeg
+@image_router.post('/upload/', response_model=CarImageUploadSchema)
+async def car_image_upload(car_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    if int(request.headers.get('content-length') or 0) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail='Image is too large')
+
+    # spooled before touching the db, a slow upload must not hold a connection
+    path, content_hash = await images.spool(request.stream())
+    try:
+        car_db = await db.get(Car, car_id)
+        extension = await run_in_threadpool(images.identify, path) if car_db else None
+        if not car_db:
+            raise HTTPException(status_code=404, detail='Car not found')
+        if not extension:
+            raise HTTPException(status_code=400, detail='Upload a JPEG, PNG or WebP image')
+
+        key, has_thumbnails = await run_in_threadpool(images.store, path, content_hash, extension)
+    finally:
+        # store moves the file into storage, anything failing before leaves it behind
+        images.discard(path)
+    image_db = await db.scalar(select(CarImage).where(CarImage.car_id == car_id,
+                                                      CarImage.content_hash == content_hash))
+    if not image_db:
+        image_db = CarImage(car_image=storage.url(key), car_id=car_id,
+                            content_hash=content_hash, has_thumbnails=has_thumbnails)
+        db.add(image_db)
+        await response_cache.touch_cars(db, [car_id])
+        await db.commit()
+        await db.refresh(image_db)
+        await response_cache.forget_cars([car_id])
+
+    if not has_thumbnails:
+        images.schedule_thumbnails(key, content_hash)
+    return {
+        'id': image_db.id,
+        'car_id': car_id,
+        'car_image': image_db.car_image,
+        'content_hash': content_hash,
+        'thumbnails': images.thumbnail_urls(content_hash, has_thumbnails),
+    }
+
+
+@image_router.get('/', response_model=CursorPage[CarImageGetSchema])
+async def car_image_list(db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                         limit: int = Depends(page_size)):
+    result = await db.execute(keyset(select(*IMAGE_COLUMNS), [CarImage.id], cursor, limit))
+    page = make_page(result.all(), [CarImage.id], limit)
+    page['items'] = [{'id': image.id, 'car_image': image.car_image, 'car_id': image.car_id,
+                      'thumbnails': images.thumbnail_urls(image.content_hash, image.has_thumbnails)}
+                     for image in page['items']]
+    return ORJSONResponse(page)
+
+
+@image_router.get('/stream/')
+async def car_image_stream(after_id: Optional[int] = None):
+    query = select(*IMAGE_COLUMNS).order_by(CarImage.id)
+    if after_id is not None:
+        query = query.where(CarImage.id > after_id)
+    return ndjson_response(query)
 
 
 @image_router.delete('/{image_id}/')
-async def car_image_delete(image_id: int, db: Session = Depends(get_db)):
-    image_db = db.query(CarImage).filter(CarImage.id == image_id).first()
+async def car_image_delete(image_id: int, db: AsyncSession = Depends(get_db)):
+    image_db = await db.get(CarImage, image_id)
     if not image_db:
         raise HTTPException(status_code=404, detail='Image not found')
 
-    db.delete(image_db)
-    db.commit()
+    await db.delete(image_db)
+    await response_cache.touch_cars(db, [image_db.car_id])
+    await db.commit()
+    await response_cache.forget_cars([image_db.car_id])
     return {'message': 'Image is deleted'}
@@ -1,58 +1,72 @@
 from auction_app.db.models import Feedback, UserProfile
-from auction_app.db.schema import FeedbackSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
+from auction_app.db.schema import FeedbackSchema, CursorPage
+from auction_app.db.database import get_db
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.db.streaming import ndjson_response
+from auction_app.responses import ORJSONResponse
+from auction_app.services import reputation
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 
 
 feedback_router = APIRouter(prefix='/feedback', tags=['Feedbacks'])
 
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+FEEDBACK_COLUMNS = (Feedback.id, Feedback.seller_id, Feedback.buyer_id, Feedback.rating, Feedback.comment)
 
 
 @feedback_router.post('/', response_model=FeedbackSchema)
-async def feedback_create(feedback: FeedbackSchema, db: Session = Depends(get_db)):
-    seller_db = db.query(UserProfile).filter(UserProfile.id == feedback.seller_id).first()
+async def feedback_create(feedback: FeedbackSchema, db: AsyncSession = Depends(get_db)):
+    seller_db = await db.get(UserProfile, feedback.seller_id)
     if not seller_db:
         raise HTTPException(status_code=404, detail='Seller not found')
 
-    buyer_db = db.query(UserProfile).filter(UserProfile.id == feedback.buyer_id).first()
+    buyer_db = await db.get(UserProfile, feedback.buyer_id)
     if not buyer_db:
         raise HTTPException(status_code=404, detail='Buyer not found')
 
     feedback_db = Feedback(**feedback.dict())
     db.add(feedback_db)
-    db.commit()
-    db.refresh(feedback_db)
+    await reputation.feedback_added(db, feedback_db.seller_id, feedback_db.rating)
+    await db.commit()
+    await db.refresh(feedback_db)
     return feedback_db
 
 
-@feedback_router.get('/', response_model=List[FeedbackSchema])
-async def feedback_list(db: Session = Depends(get_db)):
-    return db.query(Feedback).all()
+@feedback_router.get('/', response_model=CursorPage[FeedbackSchema])
+async def feedback_list(db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                        limit: int = Depends(page_size)):
+    result = await db.execute(keyset(select(*FEEDBACK_COLUMNS), [Feedback.id], cursor, limit))
+    return ORJSONResponse(make_page(result.all(), [Feedback.id], limit))
+
+
+@feedback_router.get('/stream/')
+async def feedback_stream(after_id: Optional[int] = None):
+    query = select(*FEEDBACK_COLUMNS).order_by(Feedback.id)
+    if after_id is not None:
+        query = query.where(Feedback.id > after_id)
+    return ndjson_response(query)
 
 
 @feedback_router.get('/{feedback_id}/', response_model=FeedbackSchema)
-async def feedback_detail(feedback_id: int, db: Session = Depends(get_db)):
-    feedback_db = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+async def feedback_detail(feedback_id: int, db: AsyncSession = Depends(get_db)):
+    feedback_db = await db.get(Feedback, feedback_id)
     if not feedback_db:
         raise HTTPException(status_code=404, detail='Feedback not found')
     return feedback_db
 
 
 @feedback_router.delete('/{feedback_id}/')
-async def feedback_delete(feedback_id: int, db: Session = Depends(get_db)):
-    feedback_db = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+async def feedback_delete(feedback_id: int, db: AsyncSession = Depends(get_db)):
+    # only the delete that actually removed the row moves the counters, a
+    # concurrent second delete gets nothing back
+    result = await db.execute(delete(Feedback).where(Feedback.id == feedback_id)
+                              .returning(Feedback.seller_id, Feedback.rating))
+    feedback_db = result.first()
     if not feedback_db:
         raise HTTPException(status_code=404, detail='Feedback not found')
 
-    db.delete(feedback_db)
-    db.commit()
+    await reputation.feedback_removed(db, feedback_db.seller_id, feedback_db.rating)
+    await db.commit()
     return {'message': 'Deleted'}
@@ -0,0 +1,19 @@
+from auction_app.db.database import async_engine
+from auction_app.db.pool import InstrumentedPool
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from fastapi import APIRouter, Response
+
+
+metrics_router = APIRouter(prefix='/metrics', tags=['Metrics'])
+
+
+# the usual prometheus scrape path, hence no trailing slash
+@metrics_router.get('', include_in_schema=False)
+async def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+# numbers are per worker process, the pid tells them apart
+@metrics_router.get('/pool/')
+async def pool_metrics():
+    return InstrumentedPool.stats.snapshot(async_engine.pool)
@@ -1,35 +1,45 @@
-from auction_app.db.models import Model, Car
+from auction_app.db.models import Car
 from auction_app.db.schema import ModelSchema, ModelDetailSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from auction_app.db.database import get_db
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.api.car import CAR_COLUMNS
+from auction_app.services import catalog
+from auction_app.services.http_cache import conditional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 
 
 model_router = APIRouter(prefix='/model', tags=['Models'])
 
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @model_router.get('/', response_model=List[ModelSchema])
-async def model_list(db: Session = Depends(get_db)):
-    return db.query(Model).all()
+async def model_list(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    digest, models = await catalog.models(db)
+    not_modified = conditional(request, response, catalog.etag(digest, 'models'), catalog.CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    return list(models.values())
 
 
 @model_router.get('/{model_id}/', response_model=ModelDetailSchema)
-async def model_detail(model_id: int, db: Session = Depends(get_db)):
-    model_db = db.query(Model).filter(Model.id == model_id).first()
+async def model_detail(model_id: int, db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                       limit: int = Depends(page_size), counts_only: bool = False):
+    _, models = await catalog.models(db)
+    model_db = models.get(model_id)
     if not model_db:
         raise HTTPException(status_code=404, detail='Model not found')
 
-    cars_db = db.query(Car).filter(Car.model_id == model_id).all()
+    if counts_only:
+        car_count = await db.scalar(select(func.count()).select_from(Car).where(Car.model_id == model_id))
+        return {'model_name': model_db['model_name'], 'car_count': car_count}
+
+    cars_db = await db.execute(keyset(select(*CAR_COLUMNS).where(Car.model_id == model_id),
+                                      [Car.id], cursor, limit))
+    page = make_page(cars_db.all(), [Car.id], limit)
     return {
-        'model_name': model_db.model_name,
-        'model_cars': cars_db,
+        'model_name': model_db['model_name'],
+        'model_cars': page['items'],
+        'next_cursor': page['next_cursor'],
     }
@@ -1,38 +1,48 @@
-from auction_app.db.models import UserProfile
-from auction_app.db.schema import UserProfileGetSchema, UserProfileSchema
-from auction_app.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from typing import List
+from auction_app.db.models import UserProfile, SellerReputation, Car, Auction
+from auction_app.db.schema import UserProfileGetSchema, UserProfileSchema, ReputationSchema, CursorPage
+from auction_app.db.database import get_db
+from auction_app.db.pagination import keyset, make_page, page_size
+from auction_app.api.auth import invalidate_user
+from auction_app.responses import ORJSONResponse
+from auction_app.services import reputation, order_book, car_facets, response_cache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 
 
 user_router = APIRouter(prefix='/user', tags=['Users'])
 
+USER_COLUMNS = (UserProfile.id, UserProfile.username, UserProfile.first_name, UserProfile.last_name,
+                UserProfile.email, UserProfile.phone_number, UserProfile.profile_image, UserProfile.role)
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
-
-@user_router.get('/', response_model=List[UserProfileGetSchema])
-async def user_list(db: Session = Depends(get_db), skip: int = 0, limit: int = 2):
-    return db.query(UserProfile).offset(skip).limit(limit).all()
+@user_router.get('/', response_model=CursorPage[UserProfileGetSchema])
+async def user_list(db: AsyncSession = Depends(get_db), cursor: Optional[str] = None,
+                    limit: int = Depends(page_size)):
+    result = await db.execute(keyset(select(*USER_COLUMNS), [UserProfile.id], cursor, limit))
+    return ORJSONResponse(make_page(result.all(), [UserProfile.id], limit))
 
 
 @user_router.get('/{user_id}/', response_model=UserProfileGetSchema)
-async def user_detail(user_id: int, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+async def user_detail(user_id: int, db: AsyncSession = Depends(get_db)):
+    user_db = await db.get(UserProfile, user_id)
     if not user_db:
         raise HTTPException(status_code=404, detail='User not found')
     return user_db
 
 
+@user_router.get('/{user_id}/reputation/', response_model=ReputationSchema)
+async def user_reputation(user_id: int, db: AsyncSession = Depends(get_db)):
+    reputation_db = await db.get(SellerReputation, user_id)
+    if not reputation_db and not await db.get(UserProfile, user_id):
+        raise HTTPException(status_code=404, detail='User not found')
+    return reputation.summary(user_id, reputation_db)
+
+
 @user_router.put('/{user_id}/', response_model=UserProfileSchema)
-async def user_update(user_id: int, user: UserProfileSchema, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+async def user_update(user_id: int, user: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    user_db = await db.get(UserProfile, user_id)
     if not user_db:
         raise HTTPException(status_code=404, detail='Car not found')
 
@@ -40,17 +50,28 @@ async def user_update(user_id: int, user: UserProfileSchema, db: Session = Depen
         setattr(user_db, user_key, user_value)
 
     db.add(user_db)
-    db.commit()
-    db.refresh(user_db)
+    await db.commit()
+    await db.refresh(user_db)
+    invalidate_user(user_id)
     return user_db
 
 
 @user_router.delete('/{user_id}/')
-async def user_delete(user_id: int, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.id == user_id).first()
+async def user_delete(user_id: int, db: AsyncSession = Depends(get_db)):
+    user_db = await db.get(UserProfile, user_id)
     if not user_db:
         raise HTTPException(status_code=404, detail='User not found')
 
-    db.delete(user_db)
-    db.commit()
+    # the seller's cars and their auctions go with it
+    cars_db = await db.execute(select(Car.id, *car_facets.COLUMNS).where(Car.seller_id == user_id))
+    cars_db = cars_db.all()
+    auction_ids = await db.scalars(select(Auction.id).join(Car).where(Car.seller_id == user_id))
+    auction_ids = auction_ids.all()
+    await db.delete(user_db)
+    await db.commit()
+    invalidate_user(user_id)
+    await car_facets.removed(cars_db)
+    await order_book.forget(*auction_ids)
+    await response_cache.forget_cars([car.id for car in cars_db])
+    await response_cache.forget_auctions(auction_ids)
     return {'message': 'Deleted'}
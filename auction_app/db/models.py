@@ -1,6 +1,8 @@
 from .database import Base
 from typing import Optional, List
-from sqlalchemy import String, Integer, Text, ForeignKey, DateTime, Enum, DECIMAL
+from sqlalchemy import (String, Integer, Text, ForeignKey, DateTime, Enum, DECIMAL, Index, Computed,
+                        Boolean, false, text, literal_column)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, relationship, mapped_column
 from datetime import datetime
 from enum import Enum as PyEnum
@@ -62,9 +64,10 @@ class RefreshToken(Base):
     __tablename__ = 'refresh_token'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    token: Mapped[str] = mapped_column(String, nullable=False)
+    token_hash: Mapped[str] = mapped_column(String(64), nullable=False, unique=True, index=True)
     created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     user: Mapped['UserProfile'] = relationship('UserProfile')
 
 
@@ -86,7 +89,7 @@ class Model(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     model_name: Mapped[str] = mapped_column(String(32), nullable=False, unique=True)
-    brand_id: Mapped[int] = mapped_column(ForeignKey('brand.id'))
+    brand_id: Mapped[int] = mapped_column(ForeignKey('brand.id'), index=True)
 
     brand: Mapped['Brand'] = relationship('Brand')
     model_cars: Mapped[List['Car']] = relationship('Car', back_populates='model',
@@ -96,18 +99,39 @@ class Model(Base):
         return f'brand: {self.brand_id} model: {self.model_name}'
 
 
+# descriptions come in several languages, so no stemming
+SEARCH_CONFIG = 'simple'
+
+
+# Every UPDATE of a car or auction row bumps these, ORM flushes and bulk
+# statements alike; the detail responses take their ETag from version.
+def version_column():
+    return mapped_column(Integer, default=1, server_default='1', onupdate=literal_column('version + 1'))
+
+
+def updated_at_column():
+    return mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow,
+                         server_default=text("(now() at time zone 'utc')"))
+
+
 class Car(Base):
     __tablename__ = 'car'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    brand_id: Mapped[int] = mapped_column(ForeignKey('brand.id'))
-    model_id: Mapped[int] = mapped_column(ForeignKey('model.id'))
+    brand_id: Mapped[int] = mapped_column(ForeignKey('brand.id'), index=True)
+    model_id: Mapped[int] = mapped_column(ForeignKey('model.id'), index=True)
     description: Mapped[str] = mapped_column(Text)
     fuel_type: Mapped[FuelChoices] = mapped_column(Enum(FuelChoices))
     transmission: Mapped[TransmissionChoices] = mapped_column(Enum(TransmissionChoices))
     mileage: Mapped[int] = mapped_column(Integer)
     price: Mapped[float] = mapped_column(DECIMAL(10, 2))
-    seller_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    seller_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
+    # kept up to date by postgres itself; deferred so cars never load it
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}', coalesce(description, ''))", persisted=True),
+        deferred=True)
+    version: Mapped[int] = version_column()
+    updated_at: Mapped[datetime] = updated_at_column()
 
     brand: Mapped['Brand'] = relationship('Brand', back_populates='brand_cars')
     model: Mapped['Model'] = relationship('Model', back_populates='model_cars')
@@ -117,13 +141,27 @@ class Car(Base):
     auctions: Mapped[List['Auction']] = relationship('Auction', back_populates='car',
                                                      cascade='all, delete-orphan')
 
+    # search sorts by (price, id) or (mileage, id), optionally inside a brand or model
+    __table_args__ = (
+        Index('ix_car_price_id', 'price', 'id'),
+        Index('ix_car_mileage_id', 'mileage', 'id'),
+        Index('ix_car_brand_id_price_id', 'brand_id', 'price', 'id'),
+        Index('ix_car_model_id_price_id', 'model_id', 'price', 'id'),
+        Index('ix_car_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+    # read the bumped version back with RETURNING, async sessions can't lazy load it
+    __mapper_args__ = {'eager_defaults': True}
+
 
 class CarImage(Base):
     __tablename__ = 'car_image'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     car_image: Mapped[str] = mapped_column(String, nullable=False)
-    car_id: Mapped[int] = mapped_column(ForeignKey('car.id'))
+    car_id: Mapped[int] = mapped_column(ForeignKey('car.id'), index=True)
+    # sha256 of uploaded files; images given as plain urls have none
+    content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)
+    has_thumbnails: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
 
     car: Mapped['Car'] = relationship('Car', back_populates='image_url')
 
@@ -132,37 +170,53 @@ class Auction(Base):
     __tablename__ = 'auction'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    car_id: Mapped[int] = mapped_column(ForeignKey('car.id'))
+    car_id: Mapped[int] = mapped_column(ForeignKey('car.id'), index=True)
     start_price : Mapped[float] = mapped_column(DECIMAL(10, 2), default=0)
     min_price: Mapped[Optional[float]] = mapped_column(DECIMAL(10, 2), nullable=True)
     start_time: Mapped[datetime] = mapped_column(DateTime)
     end_time: Mapped[datetime] = mapped_column(DateTime)
     status: Mapped[AuctionStatus] = mapped_column(Enum(AuctionStatus), default=AuctionStatus.waiting.value)
+    current_price: Mapped[Optional[float]] = mapped_column(DECIMAL(10, 2), nullable=True)
+    current_winner_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user_profile.id'), nullable=True)
+    winner_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user_profile.id'), nullable=True)
+    version: Mapped[int] = version_column()
+    updated_at: Mapped[datetime] = updated_at_column()
 
     car: Mapped['Car'] = relationship('Car', back_populates='auctions')
     bids: Mapped[List['Bid']] = relationship('Bid', back_populates='auction',
                                              cascade='all, delete-orphan')
 
+    __table_args__ = (
+        Index('ix_auction_status_start_time', 'status', 'start_time'),
+        Index('ix_auction_status_end_time', 'status', 'end_time'),
+    )
+    __mapper_args__ = {'eager_defaults': True}
+
 
 class Bid(Base):
     __tablename__ = 'bid'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     auction_id: Mapped[int] = mapped_column(ForeignKey('auction.id'))
-    buyer_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    buyer_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     amount: Mapped[float] = mapped_column(DECIMAL(10, 2), nullable=False)
     created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     auction: Mapped['Auction'] = relationship('Auction', back_populates='bids')
     buyer: Mapped['UserProfile'] = relationship('UserProfile')
 
+    # also serves every lookup by auction_id alone
+    __table_args__ = (
+        Index('ix_bid_auction_id_amount', 'auction_id', amount.desc()),
+    )
+
 
 class Feedback(Base):
     __tablename__ = 'feedback'
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    seller_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
-    buyer_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'))
+    seller_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
+    buyer_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id'), index=True)
     # add constraint  both can't be null
     rating: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     comment: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -170,3 +224,17 @@ class Feedback(Base):
     seller: Mapped['UserProfile'] = relationship('UserProfile', back_populates='feedbacks',
                                                  foreign_keys=[seller_id])
     buyer: Mapped['UserProfile'] = relationship('UserProfile', foreign_keys=[buyer_id])
+
+
+class SellerReputation(Base):
+    __tablename__ = 'seller_reputation'
+
+    seller_id: Mapped[int] = mapped_column(ForeignKey('user_profile.id', ondelete='CASCADE'), primary_key=True)
+    feedback_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_1: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_2: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_3: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_4: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rating_5: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -0,0 +1,68 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def page_size(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    return limit
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, keys: list) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [_load(value, key) for value, key in zip(values, keys)]
+    except (binascii.Error, ValueError, TypeError, OverflowError, InvalidOperation):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def _load(value, key):
+    # asyncpg wants real python values for the bind params, not their json form
+    python_type = key.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    value = python_type(value)
+    if python_type is Decimal and not value.is_finite():
+        raise ValueError(value)
+    return value
+
+
+def keyset(query, keys: list, cursor: Optional[str], limit: int, descending: bool = False):
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        if descending:
+            query = query.where(tuple_(*keys) < tuple_(*values))
+        else:
+            query = query.where(tuple_(*keys) > tuple_(*values))
+
+    order = [key.desc() for key in keys] if descending else keys
+    # one extra row tells whether there is a next page
+    return query.order_by(*order).limit(limit + 1)
+
+
+def make_page(rows: list, keys: list, limit: int, total: Optional[int] = None) -> dict:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+    return {
+        'items': rows,
+        'next_cursor': next_cursor,
+        'total': total,
+    }
@@ -0,0 +1,58 @@
+import os
+import time
+from bisect import bisect_left
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+# upper bounds in seconds for the checkout latency histogram
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+class PoolStats:
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float, timed_out: bool = False):
+        self.checkouts += 1
+        self.timeouts += timed_out
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def snapshot(self, pool) -> dict:
+        return {
+            'pid': os.getpid(),
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'in_use': pool.checkedout(),
+            # negative while the pool hasn't opened all of its base connections yet
+            'overflow': pool.overflow(),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+            'wait_max_ms': round(self.wait_max * 1000, 3),
+            'wait_histogram': {f'le_{bound}': count
+                               for bound, count in zip(LATENCY_BUCKETS + ('inf',), self.buckets)},
+        }
+
+
+# Times every checkout, i.e. waiting for a free connection plus opening a
+# new one. Only the event loop thread touches it, so no locking.
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.stats.observe(time.perf_counter() - started, timed_out)
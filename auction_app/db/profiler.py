@@ -0,0 +1,150 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from auction_app.config import SQL_PROFILER_STRICT, SQL_SLOW_QUERY_MS, SQL_N_PLUS_ONE_THRESHOLD
+from auction_app.db.database import engine, async_engine
+from auction_app.instrumentation import route_name
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+# Statements an endpoint may run, keyed by 'METHOD route template'. Strict
+# mode (tests) fails a request that goes over, so a new per-row query shows
+# up as a red test instead of a slow page in production.
+QUERY_BUDGETS = {
+    # page, COUNT(*) with with_total=true, images
+    'GET /car/': 3,
+    'GET /car/search/': 3,
+    'GET /car/{car_id}/': 2,
+    'POST /car/': 4,
+    'GET /auction/': 2,
+    'GET /auction/{auction_id}/': 2,
+    'GET /bid/': 1,
+    'POST /bid/': 4,
+    'GET /feedback/': 1,
+    'POST /feedback/': 5,
+    'GET /car_image/': 1,
+    'GET /user/': 1,
+    'GET /user/{user_id}/reputation/': 2,
+}
+
+EXPLAINABLE = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'}
+# asyncpg renders IN lists as ($1::INTEGER, $2::INTEGER)
+_CASTS = re.compile(r'::\w+(?:\s*\(\s*\d+(?:\s*,\s*\d+)*\s*\))?(?:\s+WITH(?:OUT)?\s+TIME\s+ZONE)?(?:\[\])*',
+                    re.IGNORECASE)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(statement: str) -> str:
+    # the shape of a statement: literals, placeholders and IN lists of any
+    # length collapse, so the same query for another row matches
+    shape = _CASTS.sub('', statement)
+    shape = _LITERALS.sub('?', shape)
+    shape = _LISTS.sub('?, ...', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+class Profile:
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> list:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+current_profile: ContextVar = ContextVar('current_profile', default=None)
+
+
+@contextmanager
+def profile():
+    # also usable around service calls in tests, without a request
+    profile = Profile()
+    token = current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        current_profile.reset(token)
+
+
+def _explain(conn, statement: str, parameters, context, executemany: bool) -> str:
+    if (executemany or context.execution_options.get('stream_results')
+            or statement.lstrip()[:6].upper() not in EXPLAINABLE):
+        return ''
+    # a raw cursor, so the EXPLAIN itself goes around these hooks; the
+    # statement has just run, so EXPLAIN won't fail and abort the transaction
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f'EXPLAIN {statement}', parameters)
+        return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+    except Exception:
+        logger.debug('Could not explain %s', statement, exc_info=True)
+        return ''
+    finally:
+        cursor.close()
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['profiler_started'].pop()
+    profile = current_profile.get()
+    if profile is not None:
+        profile.statements += 1
+        profile.seconds += elapsed
+        profile.shapes[fingerprint(statement)] += 1
+
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        logger.warning('Slow query (%.1f ms): %s\n%s', elapsed * 1000, statement,
+                       _explain(conn, statement, parameters, context, executemany))
+
+
+def install():
+    # sqladmin still goes through the sync engine
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, 'before_cursor_execute', _before)
+        event.listen(target, 'after_cursor_execute', _after)
+
+
+def check(endpoint: str, profile: Profile):
+    for shape, count in profile.repeated():
+        logger.warning('Possible N+1 in %s, ran %d times: %s', endpoint, count, shape)
+
+    budget = QUERY_BUDGETS.get(endpoint)
+    if budget is not None and profile.statements > budget:
+        message = f'{endpoint} ran {profile.statements} statements, its budget is {budget}'
+        if SQL_PROFILER_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        root_path = scope.get('root_path', '')
+        with profile() as request_profile:
+            await self.app(scope, receive, send)
+
+        endpoint = f"{scope['method']} {route_name(scope, root_path)}"
+        logger.info('%s ran %d statements in %.1f ms', endpoint,
+                    request_profile.statements, request_profile.seconds * 1000)
+        check(endpoint, request_profile)
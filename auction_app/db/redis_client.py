@@ -0,0 +1,29 @@
+import time
+import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from auction_app.config import REDIS_URL
+from auction_app.instrumentation import REDIS_LATENCY
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_LATENCY.labels('PIPELINE').observe(time.perf_counter() - started)
+
+
+class InstrumentedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_LATENCY.labels(str(args[0]).upper()).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+redis_client = InstrumentedRedis.from_url(REDIS_URL, encoding='utf-8', decode_responses=True)
@@ -1,7 +1,17 @@
 from pydantic import BaseModel, Field, EmailStr
 from .models import AuctionStatus, RoleChoices, FuelChoices, TransmissionChoices
-from typing import Optional, List
+from typing import Optional, List, Dict, Generic, TypeVar
 from datetime import datetime
+from decimal import Decimal
+
+
+T = TypeVar('T')
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: List[T] = []
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
 
 
 class UserProfileSchema(BaseModel):
@@ -25,7 +35,16 @@ class UserProfileGetSchema(BaseModel):
     last_name: Optional[str]
     email: EmailStr
     phone_number: Optional[str]
-    profile_image: str
+    profile_image: Optional[str] = None
+    role: RoleChoices
+
+    class Config:
+        from_attributes = True
+
+
+class CurrentUserSchema(BaseModel):
+    id: int
+    username: str
     role: RoleChoices
 
     class Config:
@@ -73,6 +92,7 @@ class CarSchema(BaseModel):
 
 class CarImageGetSchema(BaseModel):
     car_image: str
+    thumbnails: Dict[int, str] = {}
 
     class Config:
         from_attributes = True
@@ -94,10 +114,35 @@ class CarGetSchema(BaseModel):
         from_attributes = True
 
 
+class CarRowSchema(BaseModel):
+    id: int
+    brand_id: int
+    model_id: int
+    description: str
+    fuel_type: FuelChoices
+    transmission: TransmissionChoices
+    mileage: int
+    price: float
+    seller_id: int
+    rank: Optional[float] = None
+    snippet: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class CarSearchSchema(BaseModel):
+    items: List[CarRowSchema] = []
+    next_cursor: Optional[str] = None
+    facets: Optional[Dict[str, Dict[str, int]]] = None
+
+
 class BrandDetailSchema(BaseModel):
     id: int
     brand_name: str
     brand_cars: List[CarSchema] = []
+    next_cursor: Optional[str] = None
+    car_count: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -106,6 +151,8 @@ class BrandDetailSchema(BaseModel):
 class ModelDetailSchema(BaseModel):
     model_name: str
     model_cars: List[CarSchema] = []
+    next_cursor: Optional[str] = None
+    car_count: Optional[int] = None
 
 
 class CarImageSchema(BaseModel):
@@ -116,10 +163,18 @@ class CarImageSchema(BaseModel):
         from_attributes = True
 
 
+class CarImageUploadSchema(BaseModel):
+    id: int
+    car_id: int
+    car_image: str
+    content_hash: str
+    thumbnails: Dict[int, str] = {}
+
+
 class AuctionSchema(BaseModel):
     car_id: int
     start_price: float
-    min_price: Optional[int]
+    min_price: Optional[float]
     start_time: datetime
     end_time: datetime
     status: AuctionStatus
@@ -132,15 +187,24 @@ class AuctionGetSchema(BaseModel):
     id: int
     car_id: int
     start_price: float
-    min_price: Optional[int]
+    min_price: Optional[float]
     start_time: datetime
     end_time: datetime
     status: AuctionStatus
+    current_price: Optional[float] = None
+    current_winner_id: Optional[int] = None
+    winner_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class BidCreateSchema(BaseModel):
+    auction_id: int
+    # the bid.amount column is DECIMAL(10, 2)
+    amount: Decimal = Field(gt=0, max_digits=10, decimal_places=2)
+
+
 class BidSchema(BaseModel):
     auction_id: int
     buyer_id: int
@@ -151,11 +215,31 @@ class BidSchema(BaseModel):
         from_attributes = True
 
 
+class LeaderboardBidSchema(BaseModel):
+    bid_id: int
+    buyer_id: int
+    amount: float
+
+
+class LeaderboardSchema(BaseModel):
+    auction_id: int
+    current_price: float
+    bids: List[LeaderboardBidSchema] = []
+
+
 class FeedbackSchema(BaseModel):
     seller_id: int
     buyer_id: int
     rating: Optional[int] = Field(None, gt=0, lt=6)
-    comment: str
+    comment: Optional[str] = None
 
     class Config:
         from_attributes = True
+
+
+class ReputationSchema(BaseModel):
+    seller_id: int
+    feedback_count: int = 0
+    rating_count: int = 0
+    average_rating: Optional[float] = None
+    histogram: Dict[int, int] = {}
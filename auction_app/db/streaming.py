@@ -0,0 +1,69 @@
+import csv
+import io
+import orjson
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from auction_app.db.database import AsyncSessionLocal
+from fastapi.responses import StreamingResponse
+
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+CSV_MEDIA_TYPE = 'text/csv'
+STREAM_CHUNK_SIZE = 1000
+
+
+def to_json(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def ndjson_line(item: dict) -> bytes:
+    return orjson.dumps(item, default=to_json, option=orjson.OPT_APPEND_NEWLINE)
+
+
+async def stream_rows(query, chunk_size: int = STREAM_CHUNK_SIZE):
+    # a streaming response outlives the request's get_db session, so the
+    # generator holds its own; yield_per keeps a server side cursor and
+    # only one chunk of rows in memory
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.mappings().partitions():
+            yield rows
+
+
+async def ndjson_rows(query):
+    async for rows in stream_rows(query):
+        yield b''.join(ndjson_line(dict(row)) for row in rows)
+
+
+async def csv_rows(query):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(query.selected_columns.keys())
+    async for rows in stream_rows(query):
+        for row in rows:
+            writer.writerow(_csv_value(value) for value in row.values())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # an empty table still gets its header
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_response(query):
+    return StreamingResponse(ndjson_rows(query), media_type=NDJSON_MEDIA_TYPE)
+
+
+def csv_response(query):
+    return StreamingResponse(csv_rows(query), media_type=CSV_MEDIA_TYPE)
+
+
+def _csv_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return '' if value is None else value
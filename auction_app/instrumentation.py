@@ -0,0 +1,129 @@
+import time
+from contextvars import ContextVar
+from auction_app.db.database import async_engine
+from auction_app.services.password_pool import password_pool
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+
+
+# Everything here is per worker process, scrape each worker on its own.
+REQUESTS = Counter('http_requests_total', 'Requests by route and status',
+                   ['method', 'route', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Time to send the whole response',
+                            ['method', 'route'],
+                            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being handled right now', ['method'])
+
+QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Time of single SQL statements', ['operation'],
+                          buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5))
+REQUEST_QUERIES = Histogram('db_queries_per_request', 'SQL statements run by one request', ['route'],
+                            buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+REQUEST_QUERY_TIME = Histogram('db_query_seconds_per_request', 'SQL time spent by one request', ['route'],
+                               buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+
+REDIS_LATENCY = Histogram('redis_command_duration_seconds', 'Time of redis commands and pipelines',
+                          ['command'],
+                          buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5))
+
+BIDS = Counter('auction_bids_total', 'Bids by outcome', ['result'])
+OUTBIDS = Counter('auction_outbids_total', 'Accepted bids that took the lead from another buyer')
+
+DB_POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Connections checked out of the pool')
+DB_POOL_IN_USE.set_function(lambda: async_engine.pool.checkedout())
+DB_POOL_IDLE = Gauge('db_pool_connections_idle', 'Connections waiting in the pool')
+DB_POOL_IDLE.set_function(lambda: async_engine.pool.checkedin())
+PASSWORD_POOL_PENDING = Gauge('password_hash_pending', 'Password hashes running or queued')
+PASSWORD_POOL_PENDING.set_function(lambda: password_pool.pending)
+PASSWORD_POOL_QUEUED = Gauge('password_hash_queued', 'Password hashes waiting for a free thread')
+PASSWORD_POOL_QUEUED.set_function(lambda: password_pool.queue_depth)
+
+
+# the pool counts its own 503s; read at scrape time, like the gauges above
+class PasswordPoolCollector(Collector):
+    def collect(self):
+        yield CounterMetricFamily('password_hash_rejected', 'Password hashes refused with a 503, pool full',
+                                  value=password_pool.rejected)
+
+
+REGISTRY.register(PasswordPoolCollector())
+
+OPERATIONS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'}
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+
+# SQLAlchemy runs the cursor events in a greenlet that shares the request's
+# context, so the hooks can find the stats of the request they belong to
+request_stats: ContextVar = ContextVar('request_stats', default=None)
+
+
+@event.listens_for(async_engine.sync_engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(async_engine.sync_engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    operation = statement.lstrip()[:6].upper()
+    QUERY_LATENCY.labels(operation if operation in OPERATIONS else 'OTHER').observe(elapsed)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += elapsed
+
+
+def route_name(scope: dict, root_path: str) -> str:
+    # the route template, never the raw path, keeps the label set small
+    route = scope.get('route')
+    mount = scope.get('root_path', '')[len(root_path):]
+    if route is not None:
+        return mount + route.path
+    return mount or 'unmatched'
+
+
+# Plain ASGI rather than BaseHTTPMiddleware, which would buffer every
+# streamed response through an extra task and queue.
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        root_path = scope.get('root_path', '')
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        in_flight = IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            request_stats.reset(token)
+            route = route_name(scope, root_path)
+            REQUESTS.labels(method, route, status).inc()
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            REQUEST_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_QUERY_TIME.labels(route).observe(stats.query_time)
@@ -1,27 +1,56 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
 import uvicorn
 from auction_app.api import (brand, model, car, auth, car_image,
-                             auction, bid, feedback, profile, social_auth)
+                             auction, bid, feedback, profile, social_auth, bulk, metrics)
 from auction_app.admin.setup import setup_admin
 from starlette.middleware.sessions import SessionMiddleware
-import redis.asyncio as aioredis
+from auction_app.db.database import AsyncSessionLocal, async_engine
+from auction_app.db.redis_client import redis_client
+from auction_app.db import profiler
+from auction_app.responses import ORJSONResponse
+from auction_app.instrumentation import MetricsMiddleware
+from auction_app.services import order_book, live_feed, scheduler, refresh_tokens, car_facets, images, rate_limit
+from auction_app.config import STORAGE_BACKEND, MEDIA_ROOT, MEDIA_URL, SQL_PROFILER
+from fastapi.staticfiles import StaticFiles
+from auction_app.services.password_pool import password_pool
 from contextlib import asynccontextmanager
-from fastapi_limiter import FastAPILimiter
+import asyncio
 
-async def init_redis():
-    return aioredis.from_url('redis://localhost', encoding='utf-8', decode_responses=True)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis = await init_redis()
-    await FastAPILimiter.init(redis)
+    async with AsyncSessionLocal() as db:
+        await order_book.rebuild(db)
+    await live_feed.hub.start()
+    jobs = [
+        asyncio.create_task(scheduler.periodic(scheduler.tick, scheduler.TICK_SECONDS)),
+        asyncio.create_task(scheduler.periodic(refresh_tokens.purge_expired,
+                                               refresh_tokens.PURGE_INTERVAL_SECONDS)),
+        asyncio.create_task(scheduler.periodic(car_facets.reconcile, car_facets.RECONCILE_SECONDS)),
+    ]
     yield
-    await redis.close()
+    for job in jobs:
+        job.cancel()
+    await asyncio.gather(*jobs, return_exceptions=True)
+    await live_feed.hub.stop()
+    password_pool.executor.shutdown(wait=False)
+    images.shutdown()
+    await redis_client.close()
+    await async_engine.dispose()
 
 
-auction_app = FastAPI(title='Auction', lifespan=lifespan)
+auction_app = FastAPI(title='Auction', lifespan=lifespan, default_response_class=ORJSONResponse,
+                      dependencies=[Depends(rate_limit.limit)])
 auction_app.add_middleware(SessionMiddleware, secret_key="SECRET_KEY")
+if SQL_PROFILER:
+    profiler.install()
+    auction_app.add_middleware(profiler.ProfilerMiddleware)
+# added last so it wraps everything else and times the whole request
+auction_app.add_middleware(MetricsMiddleware)
 setup_admin(auction_app)
+if STORAGE_BACKEND == 'local' and MEDIA_URL.startswith('/'):
+    # behind a real web server, let it serve MEDIA_ROOT instead
+    auction_app.mount(MEDIA_URL.rstrip('/'), StaticFiles(directory=MEDIA_ROOT, check_dir=False), name='media')
 
 auction_app.include_router(auth.auth_router)
 auction_app.include_router(profile.user_router)
@@ -33,6 +62,8 @@ auction_app.include_router(auction.auction_router)
 auction_app.include_router(bid.bid_router)
 auction_app.include_router(feedback.feedback_router)
 auction_app.include_router(social_auth.social_router)
+auction_app.include_router(bulk.bulk_router)
+auction_app.include_router(metrics.metrics_router)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,19 @@
+import orjson
+from decimal import Decimal
+from fastapi.responses import JSONResponse
+from sqlalchemy.engine import Row
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Row):
+        return value._asdict()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+# Read endpoints hand Row tuples straight to this response, skipping the
+# per-row pydantic pass; their column lists mirror the response schemas.
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,85 @@
+from auction_app.db.models import Auction, AuctionStatus, Bid
+from auction_app.services import order_book, live_feed, response_cache
+from auction_app.instrumentation import BIDS, OUTBIDS
+from sqlalchemy import select, insert, update, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from datetime import datetime
+from decimal import Decimal
+
+
+async def place_bid(db: AsyncSession, auction_id: int, buyer_id: int, amount: Decimal) -> Bid:
+    # BidCreateSchema already limits it to two places, this is for callers
+    # passing floats
+    amount = Decimal(str(amount)).quantize(Decimal('0.01'))
+    if amount <= 0:
+        BIDS.labels('too_low').inc()
+        raise HTTPException(status_code=400, detail='Bid must be higher than the current price')
+    now = datetime.utcnow()
+
+    # The conditional UPDATE checks and moves the price in one statement and
+    # keeps the auction row locked until commit, so concurrent bids on the
+    # same auction queue up there and re-check against the committed price.
+    result = await db.execute(
+        update(Auction)
+        .where(Auction.id == auction_id,
+               Auction.status == AuctionStatus.started,
+               Auction.start_time <= now,
+               Auction.end_time > now,
+               or_(and_(Auction.current_price.is_(None), Auction.start_price <= amount),
+                   Auction.current_price < amount))
+        .values(current_price=amount, current_winner_id=buyer_id)
+        .returning(Auction.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.scalar() is None:
+        await db.rollback()
+        await reject_bid(db, auction_id, amount, now)
+
+    # the insert starts after the auction row is locked, so its snapshot sees
+    # every earlier bid and the subquery finds the buyer who led until now
+    previous_leader = (select(Bid.buyer_id).where(Bid.auction_id == auction_id, Bid.amount < amount)
+                       .order_by(Bid.amount.desc()).limit(1).scalar_subquery())
+    try:
+        result = await db.execute(
+            insert(Bid)
+            .values(auction_id=auction_id, buyer_id=buyer_id, amount=amount, created_date=now)
+            .returning(Bid, previous_leader)
+        )
+        bid_db, previous_buyer_id = result.one()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        BIDS.labels('buyer_not_found').inc()
+        raise HTTPException(status_code=404, detail='Buyer not found')
+
+    BIDS.labels('accepted').inc()
+    if previous_buyer_id is not None and previous_buyer_id != buyer_id:
+        OUTBIDS.inc()
+    await order_book.record_bid(bid_db)
+    await response_cache.forget_auctions([auction_id])
+    await live_feed.publish(auction_id, {
+        'type': 'bid',
+        'bid_id': bid_db.id,
+        'buyer_id': buyer_id,
+        'amount': float(amount),
+        'current_price': float(amount),
+        'created_date': now.isoformat(),
+    })
+    return bid_db
+
+
+async def reject_bid(db: AsyncSession, auction_id: int, amount: Decimal, now: datetime):
+    auction_db = await db.get(Auction, auction_id)
+    if not auction_db:
+        BIDS.labels('auction_not_found').inc()
+        raise HTTPException(status_code=404, detail='Auction not found')
+
+    if (auction_db.status != AuctionStatus.started
+            or not auction_db.start_time <= now < auction_db.end_time):
+        BIDS.labels('auction_not_active').inc()
+        raise HTTPException(status_code=400, detail='Auction is not active')
+
+    BIDS.labels('too_low').inc()
+    raise HTTPException(status_code=400, detail='Bid must be higher than the current price')
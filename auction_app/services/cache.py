@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+# small in-process LRU with per-entry expiry; not thread safe, only touch it
+# from the event loop
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        item = self.data.get(key)
+        if item is None:
+            return default
+
+        expires, value = item
+        if expires <= time.monotonic():
+            del self.data[key]
+            return default
+
+        self.data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self.data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self.data.pop(key, None)
+        return default if item is None else item[1]
+
+    def drop_where(self, predicate):
+        for key in [key for key, (_, value) in self.data.items() if predicate(value)]:
+            del self.data[key]
+
+    def clear(self):
+        self.data.clear()
@@ -0,0 +1,150 @@
+import logging
+from bisect import bisect_right
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import Car
+from auction_app.db.redis_client import redis_client
+from auction_app.services import scheduler
+from sqlalchemy import select, func, case, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+# Facet counts live in one redis hash, 'field:value' -> number of cars.
+# Car writes adjust it with HINCRBY, so reading the facets is a single
+# HGETALL no matter how many cars there are. Anything that slips past the
+# counters (admin edits, a HINCRBY racing a rebuild) is fixed by reconcile,
+# which one worker at a time runs every RECONCILE_SECONDS.
+FACETS_KEY = 'car:facets'
+RECONCILED_KEY = 'car:facets:reconciled'
+RECONCILE_SECONDS = 10 * 60
+RECONCILE_LOCK_KEY = 7_340_002
+PRICE_BOUNDS = (5_000, 10_000, 20_000, 50_000, 100_000)
+MILEAGE_BOUNDS = (10_000, 50_000, 100_000, 200_000)
+FIELDS = ('brand_id', 'model_id', 'fuel_type', 'transmission')
+# what facet_fields reads, for callers that select rows instead of loading cars
+COLUMNS = (Car.brand_id, Car.model_id, Car.fuel_type, Car.transmission, Car.price, Car.mileage)
+
+
+def _label(bounds: tuple, index: int) -> str:
+    if index == len(bounds):
+        return f'{bounds[-1]}+'
+    low = bounds[index - 1] if index else 0
+    return f'{low}-{bounds[index]}'
+
+
+def _enum_value(value):
+    return getattr(value, 'value', value)
+
+
+def facet_fields(car) -> list:
+    fields = [f'{name}:{_enum_value(getattr(car, name))}' for name in FIELDS]
+    fields.append(f'price:{_label(PRICE_BOUNDS, bisect_right(PRICE_BOUNDS, float(car.price)))}')
+    fields.append(f'mileage:{_label(MILEAGE_BOUNDS, bisect_right(MILEAGE_BOUNDS, car.mileage))}')
+    return fields
+
+
+async def _apply(changes: dict):
+    changes = {field: delta for field, delta in changes.items() if delta}
+    if not changes:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for field, delta in changes.items():
+                pipe.hincrby(FACETS_KEY, field, delta)
+            await pipe.execute()
+    except RedisError:
+        # postgres is the truth, the counters are fixed by the next rebuild
+        logger.warning('Could not update car facet counts', exc_info=True)
+
+
+async def added(cars: list):
+    changes = {}
+    for car in cars:
+        for field in facet_fields(car):
+            changes[field] = changes.get(field, 0) + 1
+    await _apply(changes)
+
+
+async def removed(cars: list):
+    changes = {}
+    for car in cars:
+        for field in facet_fields(car):
+            changes[field] = changes.get(field, 0) - 1
+    await _apply(changes)
+
+
+async def moved(old_fields: list, car):
+    changes = {field: -1 for field in old_fields}
+    for field in facet_fields(car):
+        changes[field] = changes.get(field, 0) + 1
+    await _apply(changes)
+
+
+def _bucket(column, bounds: tuple):
+    # same numbering as bisect_right, so sql and python agree on the buckets;
+    # inlined constants, bind params would stop postgres matching the
+    # select expression to the one in GROUP BY
+    return case(*[(column < literal_column(str(bound)), literal_column(str(index)))
+                  for index, bound in enumerate(bounds)],
+                else_=literal_column(str(len(bounds))))
+
+
+async def rebuild(db: AsyncSession):
+    price = _bucket(Car.price, PRICE_BOUNDS).label('price')
+    mileage = _bucket(Car.mileage, MILEAGE_BOUNDS).label('mileage')
+    columns = [Car.brand_id, Car.model_id, Car.fuel_type, Car.transmission, price, mileage]
+
+    # one pass over car for every facet, each row carries exactly one non-null key
+    result = await db.execute(
+        select(*columns, func.count())
+        .group_by(func.grouping_sets(*columns))
+    )
+    counts = {}
+    for *keys, count in result:
+        for name, value in zip(FIELDS + ('price', 'mileage'), keys):
+            if value is None:
+                continue
+            if name == 'price':
+                value = _label(PRICE_BOUNDS, value)
+            elif name == 'mileage':
+                value = _label(MILEAGE_BOUNDS, value)
+            counts[f'{name}:{_enum_value(value)}'] = count
+
+    # build aside and swap in, readers never see a half-filled hash
+    building = f'{FACETS_KEY}:rebuild'
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(building)
+        if counts:
+            pipe.hset(building, mapping=counts)
+            pipe.rename(building, FACETS_KEY)
+        else:
+            pipe.delete(FACETS_KEY)
+        await pipe.execute()
+
+
+async def reconcile():
+    async with AsyncSessionLocal() as db:
+        if not await scheduler.try_lock(db, RECONCILE_LOCK_KEY):
+            return
+        # once per interval for the whole cluster, however many workers boot
+        if not await redis_client.set(RECONCILED_KEY, 1, nx=True, ex=RECONCILE_SECONDS - 1):
+            return
+        await rebuild(db)
+
+
+async def facets() -> Optional[dict]:
+    try:
+        counts = await redis_client.hgetall(FACETS_KEY)
+    except RedisError:
+        logger.warning('Could not read car facet counts', exc_info=True)
+        return None
+
+    result = {name: {} for name in FIELDS + ('price', 'mileage')}
+    for field, count in counts.items():
+        name, value = field.split(':', 1)
+        if int(count) > 0:
+            result[name][value] = int(count)
+    return result
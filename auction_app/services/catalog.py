@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import time
+from auction_app.db.models import Brand, Model
+from auction_app.db.redis_client import redis_client
+from auction_app.services.cache import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis.exceptions import RedisError
+
+
+# Brands and models are cached per worker and in redis under a shared
+# version number. Writes bump the version, which orphans every cached
+# entry at once; other workers notice within LOCAL_SECONDS. Without redis
+# each worker keeps its last version and reads through to postgres.
+VERSION_KEY = 'catalog:version'
+LOCAL_SECONDS = 5
+REDIS_SECONDS = 60 * 60
+CACHE_CONTROL = 'public, max-age=60'
+
+logger = logging.getLogger(__name__)
+
+local_cache = TTLCache(maxsize=64, ttl=LOCAL_SECONDS)
+last_version = 0
+
+
+def _seed() -> int:
+    # a counter lost with redis restarts above every version it handed out,
+    # so it never lands on an old entry still cached under that version
+    return int(time.time() * 1000)
+
+
+async def version() -> int:
+    global last_version
+    current = local_cache.get(VERSION_KEY)
+    if current is None:
+        try:
+            current = await redis_client.get(VERSION_KEY)
+            if current is None:
+                await redis_client.set(VERSION_KEY, _seed(), nx=True)
+                current = await redis_client.get(VERSION_KEY)
+            current = last_version = int(current)
+        except RedisError:
+            logger.warning('Could not read the catalog version', exc_info=True)
+            current = last_version
+        local_cache.set(VERSION_KEY, current)
+    return current
+
+
+async def invalidate():
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(VERSION_KEY, _seed(), nx=True)
+            pipe.incr(VERSION_KEY)
+            await pipe.execute()
+    except RedisError:
+        # other workers keep their copies until LOCAL_SECONDS runs out
+        logger.warning('Could not bump the catalog version', exc_info=True)
+    local_cache.clear()
+
+
+# from the content, not the version: a version counter lost with redis
+# starts over and would hand out old ETags for new content
+def etag(digest: str, name: str) -> str:
+    return f'W/"catalog-{name}-{digest}"'
+
+
+async def _cached(db: AsyncSession, name: str, query):
+    current = await version()
+    key = f'catalog:v{current}:{name}'
+    entry = local_cache.get(key)
+    if entry is not None:
+        return entry
+
+    try:
+        raw = await redis_client.get(key)
+    except RedisError:
+        logger.warning('Could not read %s from redis', key, exc_info=True)
+        raw = None
+    if raw is None:
+        result = await db.execute(query)
+        raw = json.dumps([dict(row._mapping) for row in result])
+        try:
+            await redis_client.set(key, raw, ex=REDIS_SECONDS)
+        except RedisError:
+            logger.warning('Could not cache %s in redis', key, exc_info=True)
+
+    # keyed by id for lookups, dicts keep the id order for listing
+    entry = hashlib.sha256(raw.encode()).hexdigest()[:16], {row['id']: row for row in json.loads(raw)}
+    local_cache.set(key, entry)
+    return entry
+
+
+async def brands(db: AsyncSession):
+    return await _cached(db, 'brands', select(Brand.id, Brand.brand_name).order_by(Brand.id))
+
+
+async def models(db: AsyncSession):
+    return await _cached(db, 'models', select(Model.id, Model.model_name, Model.brand_id).order_by(Model.id))
+
+
+async def model_matches_brand(db: AsyncSession, model_id: int, brand_id: int) -> bool:
+    _, models_by_id = await models(db)
+    model = models_by_id.get(model_id)
+    if model is None:
+        # maybe added on another worker a moment ago, ask postgres before saying no
+        return await db.scalar(select(Model.id).where(Model.id == model_id,
+                                                      Model.brand_id == brand_id)) is not None
+    return model['brand_id'] == brand_id
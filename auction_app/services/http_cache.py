@@ -0,0 +1,19 @@
+from fastapi import Request, Response
+from typing import Optional
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def conditional(request: Request, response: Response, etag: str, cache_control: str) -> Optional[Response]:
+    # returns the 304 to send, or None after putting the headers on the response
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
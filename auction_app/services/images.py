@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from auction_app.config import UPLOAD_TMP_DIR, MAX_IMAGE_BYTES, THUMBNAIL_SIZES, THUMBNAIL_WORKERS
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import CarImage
+from auction_app.services.storage import storage
+from auction_app.services import response_cache
+from sqlalchemy import update
+from starlette.concurrency import run_in_threadpool
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+# resizing is CPU bound but pillow drops the GIL for it, like bcrypt
+executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+tasks = set()
+
+
+def original_key(content_hash: str, extension: str) -> str:
+    return f'originals/{content_hash[:2]}/{content_hash}{extension}'
+
+
+def thumbnail_key(content_hash: str, size: int) -> str:
+    return f'thumbnails/{content_hash[:2]}/{content_hash}/{size}.webp'
+
+
+def thumbnail_urls(content_hash, has_thumbnails: bool) -> dict:
+    if not content_hash or not has_thumbnails:
+        return {}
+    return {size: storage.url(thumbnail_key(content_hash, size)) for size in THUMBNAIL_SIZES}
+
+
+async def spool(chunks):
+    # hashes while writing, the upload is never held in memory as a whole
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    file = tempfile.NamedTemporaryFile(dir=UPLOAD_TMP_DIR, delete=False)
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise HTTPException(status_code=413, detail='Image is too large')
+            digest.update(chunk)
+            await run_in_threadpool(file.write, chunk)
+    except BaseException:
+        file.close()
+        os.remove(file.name)
+        raise
+    file.close()
+    return file.name, digest.hexdigest()
+
+
+def discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def identify(path: str):
+    try:
+        with Image.open(path) as image:
+            extension = FORMATS.get(image.format)
+            image.verify()
+    except Exception:
+        return None
+    return extension
+
+
+def store(path: str, content_hash: str, extension: str):
+    key = original_key(content_hash, extension)
+    if storage.exists(key):
+        # same bytes were uploaded before, keep the one copy
+        os.remove(path)
+    else:
+        storage.save_file(key, path)
+    # the largest size is written last, so it marks a finished set
+    return key, storage.exists(thumbnail_key(content_hash, THUMBNAIL_SIZES[-1]))
+
+
+def _render(key: str, content_hash: str):
+    with storage.open(key) as file, Image.open(file) as image:
+        # lets jpeg decode at a fraction of the size when it can
+        image.draft('RGB', (THUMBNAIL_SIZES[-1], THUMBNAIL_SIZES[-1]))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for size in THUMBNAIL_SIZES:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, 'WEBP', quality=80)
+            storage.save_bytes(thumbnail_key(content_hash, size), buffer.getvalue())
+
+
+async def _make_thumbnails(key: str, content_hash: str):
+    try:
+        await asyncio.get_running_loop().run_in_executor(executor, _render, key, content_hash)
+    except Exception:
+        # listings keep showing the original until the next upload retries
+        logger.exception('Could not make thumbnails for %s', key)
+        return
+
+    async with AsyncSessionLocal() as db:
+        car_ids = await db.scalars(update(CarImage).where(CarImage.content_hash == content_hash)
+                                   .values(has_thumbnails=True).returning(CarImage.car_id))
+        car_ids = await response_cache.touch_cars(db, car_ids.all())
+        await db.commit()
+    await response_cache.forget_cars(car_ids)
+
+
+def schedule_thumbnails(key: str, content_hash: str):
+    task = asyncio.create_task(_make_thumbnails(key, content_hash))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+def shutdown():
+    executor.shutdown(wait=False, cancel_futures=True)
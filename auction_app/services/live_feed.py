@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from auction_app.db.redis_client import redis_client
+from fastapi import WebSocket
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PATTERN = 'auction:*:live'
+SEND_QUEUE_SIZE = 64
+KEEP_ALIVE_SECONDS = 15
+
+
+def channel(auction_id: int) -> str:
+    return f'auction:{auction_id}:live'
+
+
+async def publish(auction_id: int, event: dict):
+    event = {'auction_id': auction_id, **event}
+    try:
+        await redis_client.publish(channel(auction_id), json.dumps(event, default=str))
+    except RedisError:
+        logger.warning('Could not publish %s event for auction %s', event.get('type'), auction_id,
+                       exc_info=True)
+
+
+async def publish_many(events: list):
+    if not events:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for auction_id, event in events:
+                event = {'auction_id': auction_id, **event}
+                pipe.publish(channel(auction_id), json.dumps(event, default=str))
+            await pipe.execute()
+    except RedisError:
+        logger.warning('Could not publish %s live events', len(events), exc_info=True)
+
+
+# one redis subscription per worker, fanned out to the local connections
+class LiveFeedHub:
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.pubsub = None
+        self.task = None
+
+    async def start(self):
+        self.pubsub = redis_client.pubsub()
+        await self.pubsub.psubscribe(CHANNEL_PATTERN)
+        self.task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        if self.pubsub:
+            await self.pubsub.aclose()
+
+    async def _listen(self):
+        while True:
+            try:
+                async for message in self.pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self._dispatch(message['channel'], message['data'])
+            except RedisError:
+                logger.warning('Live feed subscription dropped, reconnecting', exc_info=True)
+                await asyncio.sleep(1)
+
+    def _dispatch(self, channel_name: str, data: str):
+        auction_id = int(channel_name.split(':')[1])
+        for queue in self.subscribers.get(auction_id, ()):
+            if queue.full():
+                # a slow consumer loses its oldest event, not our memory;
+                # every event carries the current price so the latest one wins
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    @asynccontextmanager
+    async def subscribe(self, auction_id: int):
+        queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.subscribers[auction_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers[auction_id].discard(queue)
+            if not self.subscribers[auction_id]:
+                del self.subscribers[auction_id]
+
+
+hub = LiveFeedHub()
+
+
+async def stream_to_websocket(websocket: WebSocket, auction_id: int):
+    async def send(queue):
+        while True:
+            await websocket.send_text(await queue.get())
+
+    async def receive():
+        # we don't expect messages, this only notices the client leaving
+        while True:
+            await websocket.receive_text()
+
+    async with hub.subscribe(auction_id) as queue:
+        tasks = [asyncio.create_task(send(queue)), asyncio.create_task(receive())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            # a disconnect surfaces here as WebSocketDisconnect, nothing to report
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def stream_events(auction_id: int):
+    async with hub.subscribe(auction_id) as queue:
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), timeout=KEEP_ALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield f'data: {data}\n\n'
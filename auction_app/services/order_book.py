@@ -0,0 +1,177 @@
+import logging
+from auction_app.db.models import Auction, AuctionStatus, Bid
+from auction_app.db.redis_client import redis_client
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+ORDER_BOOK_SIZE = 20
+CLOSED_BOOK_TTL = 24 * 60 * 60
+OPEN_STATUSES = [AuctionStatus.waiting, AuctionStatus.started]
+
+# Adds a bid (if any) to the book, trims it to the top N and only ever
+# raises the price, so replays and out-of-order writes are harmless.
+# The price key doubles as the "book is loaded" marker: plain bid writes
+# never create it, so a book lost on the redis side is reloaded from
+# postgres on the next read instead of being served half empty.
+RECORD_BID = redis_client.register_script("""
+if ARGV[2] ~= '' then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, -tonumber(ARGV[3]) - 1)
+end
+local price = redis.call('GET', KEYS[2])
+if (price or ARGV[4] == '1') and (not price or tonumber(price) < tonumber(ARGV[1])) then
+    redis.call('SET', KEYS[2], ARGV[1])
+end
+return 1
+""")
+
+
+def bids_key(auction_id: int) -> str:
+    return f'auction:{auction_id}:bids'
+
+
+def price_key(auction_id: int) -> str:
+    return f'auction:{auction_id}:price'
+
+
+def _member(bid_id: int, buyer_id: int) -> str:
+    return f'{bid_id}:{buyer_id}'
+
+
+def _record(auction_id: int, price, bid_id=None, buyer_id=None, load=True, client=None):
+    member = _member(bid_id, buyer_id) if bid_id is not None else ''
+    return RECORD_BID(keys=[bids_key(auction_id), price_key(auction_id)],
+                      args=[str(price), member, ORDER_BOOK_SIZE, int(load)], client=client)
+
+
+async def record_bid(bid: Bid):
+    try:
+        await _record(bid.auction_id, bid.amount, bid.id, bid.buyer_id, load=False)
+    except RedisError:
+        # postgres already has the bid, the book catches up on the next rebuild
+        logger.warning('Could not write bid %s to the order book', bid.id, exc_info=True)
+
+
+async def forget(*auction_ids: int):
+    if not auction_ids:
+        return
+    keys = [key for auction_id in auction_ids for key in (bids_key(auction_id), price_key(auction_id))]
+    try:
+        await redis_client.delete(*keys)
+    except RedisError:
+        # the change is already committed, a stale book beats failing the request
+        logger.warning('Could not drop the order books of auctions %s', auction_ids, exc_info=True)
+
+
+async def retire(auction_ids: list):
+    # closed auctions keep their book around for a day, then reload on demand
+    if not auction_ids:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for auction_id in auction_ids:
+                pipe.expire(bids_key(auction_id), CLOSED_BOOK_TTL)
+                pipe.expire(price_key(auction_id), CLOSED_BOOK_TTL)
+            await pipe.execute()
+    except RedisError:
+        logger.warning('Could not retire %s order books', len(auction_ids), exc_info=True)
+
+
+async def _from_postgres(db: AsyncSession, auction_id: int):
+    auction_db = await db.get(Auction, auction_id)
+    if not auction_db:
+        raise HTTPException(status_code=404, detail='Auction not found')
+
+    bids_db = await db.execute(
+        select(Bid.id, Bid.buyer_id, Bid.amount)
+        .where(Bid.auction_id == auction_id)
+        .order_by(Bid.amount.desc())
+        .limit(ORDER_BOOK_SIZE)
+    )
+    return auction_db.current_price or auction_db.start_price, bids_db.all()
+
+
+async def load_auction(db: AsyncSession, auction_id: int):
+    price, bids = await _from_postgres(db, auction_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        await _record(auction_id, price, client=pipe)
+        for bid_id, buyer_id, amount in bids:
+            await _record(auction_id, amount, bid_id, buyer_id, client=pipe)
+        await pipe.execute()
+
+
+async def rebuild(db: AsyncSession, chunk_size: int = 1000):
+    # merges instead of replacing, so it is safe while other workers take bids
+    auctions_db = await db.stream(
+        select(Auction.id, func.coalesce(Auction.current_price, Auction.start_price))
+        .where(Auction.status.in_(OPEN_STATUSES))
+        .execution_options(yield_per=chunk_size)
+    )
+    async for chunk in auctions_db.partitions():
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for auction_id, price in chunk:
+                await _record(auction_id, price, client=pipe)
+            await pipe.execute()
+
+    ranked = (
+        select(Bid.id, Bid.auction_id, Bid.buyer_id, Bid.amount,
+               func.row_number().over(partition_by=Bid.auction_id,
+                                      order_by=Bid.amount.desc()).label('rank'))
+        .join(Auction, Auction.id == Bid.auction_id)
+        .where(Auction.status.in_(OPEN_STATUSES))
+        .subquery()
+    )
+    bids_db = await db.stream(
+        select(ranked.c.id, ranked.c.auction_id, ranked.c.buyer_id, ranked.c.amount)
+        .where(ranked.c.rank <= ORDER_BOOK_SIZE)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for chunk in bids_db.partitions():
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for bid_id, auction_id, buyer_id, amount in chunk:
+                await _record(auction_id, amount, bid_id, buyer_id, client=pipe)
+            await pipe.execute()
+
+
+async def _read(auction_id: int):
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zrevrange(bids_key(auction_id), 0, ORDER_BOOK_SIZE - 1, withscores=True)
+        pipe.get(price_key(auction_id))
+        return await pipe.execute()
+
+
+async def leaderboard(db: AsyncSession, auction_id: int) -> dict:
+    try:
+        bids, price = await _read(auction_id)
+        if price is None:
+            await load_auction(db, auction_id)
+            bids, price = await _read(auction_id)
+    except RedisError:
+        logger.warning('Could not read the order book of auction %s', auction_id, exc_info=True)
+        price, bids = await _from_postgres(db, auction_id)
+        return {
+            'auction_id': auction_id,
+            'current_price': float(price),
+            'bids': [{'bid_id': bid_id, 'buyer_id': buyer_id, 'amount': float(amount)}
+                     for bid_id, buyer_id, amount in bids],
+        }
+
+    # a bid may land between the postgres read and the redis write of a load
+    if bids:
+        price = max(float(price), bids[0][1])
+
+    return {
+        'auction_id': auction_id,
+        'current_price': float(price),
+        'bids': [_unpack(member, amount) for member, amount in bids],
+    }
+
+
+def _unpack(member: str, amount: float) -> dict:
+    bid_id, buyer_id = member.split(':')
+    return {'bid_id': int(bid_id), 'buyer_id': int(buyer_id), 'amount': amount}
@@ -0,0 +1,35 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from auction_app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+from fastapi import HTTPException
+
+
+# bcrypt releases the GIL while hashing, so a thread pool spreads it over
+# the cores and keeps the event loop free
+class PasswordPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.pending - self.workers, 0)
+
+    async def run(self, func, *args):
+        # failing fast beats queueing logins for seconds behind each other
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail='Server is busy, try again later',
+                                headers={'Retry-After': '1'})
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+
+password_pool = PasswordPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
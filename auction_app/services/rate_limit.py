@@ -0,0 +1,172 @@
+import logging
+import time
+from datetime import datetime
+from auction_app.config import SECRET_KEY, ALGORITHM, RATE_LIMIT_ENABLED, BID_CLOSING_SECONDS
+from auction_app.db.models import Auction
+from auction_app.db.redis_client import redis_client
+from auction_app.services.cache import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+from jose import jwt, JWTError
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+
+class Policy:
+    # `times` requests per `seconds`, refilled smoothly; a full bucket
+    # allows a burst of `times`
+    def __init__(self, times: int, seconds: float):
+        self.capacity = times
+        self.rate = times / seconds
+
+
+POLICIES = {
+    'login': Policy(3, 5),
+    'register': Policy(5, 60),
+    'bid': Policy(10, 10),
+    # per auction, so a closing rush on one auction doesn't starve the rest
+    'bid_closing': Policy(30, 10),
+    'write': Policy(30, 60),
+    'list': Policy(120, 60),
+    'search': Policy(60, 60),
+    'export': Policy(5, 60),
+    # one request can carry any number of rows
+    'import': Policy(2, 60),
+}
+
+# 'METHOD route template' -> policy. Routes that share a policy share the
+# bucket, so a scraper walking every list endpoint has one budget for all of
+# them. POST /bid/ is limited in bid_create, it needs the auction first.
+ROUTE_POLICIES = {
+    'POST /auth/login/': 'login',
+    'POST /auth/register/': 'register',
+    'GET /car/': 'list',
+    'GET /car/search/': 'search',
+    'GET /auction/': 'list',
+    'GET /bid/': 'list',
+    'GET /feedback/': 'list',
+    'GET /car_image/': 'list',
+    'GET /user/': 'list',
+    'POST /car/': 'write',
+    'POST /car_image/': 'write',
+    'POST /car_image/upload/': 'write',
+    'POST /auction/': 'write',
+    'POST /feedback/': 'write',
+    'GET /car_image/stream/': 'export',
+    'GET /auction/stream/': 'export',
+    'GET /bid/stream/': 'export',
+    'GET /feedback/stream/': 'export',
+    'POST /bulk/car/': 'import',
+    'POST /bulk/car_image/': 'import',
+    'POST /bulk/auction/': 'import',
+    'GET /bulk/car/': 'export',
+    'GET /bulk/car_image/': 'export',
+    'GET /bulk/auction/': 'export',
+}
+
+# One round trip per check. Redis' own clock refills the bucket, so workers
+# with skewed clocks still agree. Returns [allowed, ms until the next token].
+TOKEN_BUCKET = redis_client.register_script("""
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, wait}
+""")
+
+# Buckets redis has turned down recently -> when they may try again. A flood
+# from one client is answered from here and never reaches redis.
+blocked = TTLCache(maxsize=10_000, ttl=1)
+AUCTION_END_SECONDS = 60
+# auction id -> end time; an end time moved by an update is picked up within a minute
+auction_ends = TTLCache(maxsize=10_000, ttl=AUCTION_END_SECONDS)
+
+
+def identity(connection: HTTPConnection) -> str:
+    # the user behind a valid bearer token, the client address otherwise;
+    # only the signature is checked here, get_current_user does the rest
+    authorization = connection.headers.get('authorization', '')
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            payload = {}
+        username = payload.get('sub') if payload.get('type') == 'access' else None
+        if username:
+            return f'user:{username}'
+    return f'ip:{connection.client.host if connection.client else "unknown"}'
+
+
+def _too_many(retry_after: float):
+    return HTTPException(status_code=429, detail='Too many requests, slow down',
+                         headers={'Retry-After': str(max(int(retry_after + 0.999), 1))})
+
+
+async def hit(policy_name: str, key: str):
+    if not RATE_LIMIT_ENABLED:
+        return
+    bucket = f'ratelimit:{policy_name}:{key}'
+    until = blocked.get(bucket)
+    if until is not None:
+        raise _too_many(until - time.monotonic())
+
+    policy = POLICIES[policy_name]
+    try:
+        allowed, wait_ms = await TOKEN_BUCKET(keys=[bucket], args=[policy.capacity, policy.rate])
+    except RedisError:
+        # better to serve unlimited for a while than to refuse everyone
+        logger.warning('Could not check the rate limit for %s', bucket, exc_info=True)
+        return
+
+    if not allowed:
+        wait = int(wait_ms) / 1000
+        blocked.set(bucket, time.monotonic() + wait, ttl=wait)
+        raise _too_many(wait)
+
+
+# app wide dependency, does nothing on routes without a policy
+async def limit(connection: HTTPConnection):
+    route = connection.scope.get('route')
+    if route is None:
+        return
+    policy_name = ROUTE_POLICIES.get(f"{connection.scope.get('method', 'WS')} {route.path}")
+    if policy_name:
+        await hit(policy_name, identity(connection))
+
+
+async def _auction_end(db: AsyncSession, auction_id: int):
+    end_time = auction_ends.get(auction_id)
+    if end_time is None:
+        end_time = await db.scalar(select(Auction.end_time).where(Auction.id == auction_id))
+        if end_time is not None:
+            auction_ends.set(auction_id, end_time)
+    return end_time
+
+
+async def limit_bid(db: AsyncSession, buyer_id: int, auction_id: int):
+    if not RATE_LIMIT_ENABLED:
+        return
+    end_time = await _auction_end(db, auction_id)
+    if end_time is not None and 0 <= (end_time - datetime.utcnow()).total_seconds() <= BID_CLOSING_SECONDS:
+        await hit('bid_closing', f'user:{buyer_id}:auction:{auction_id}')
+    else:
+        await hit('bid', f'user:{buyer_id}')
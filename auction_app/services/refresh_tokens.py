@@ -0,0 +1,70 @@
+import logging
+import time
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import RefreshToken
+from auction_app.db.redis_client import redis_client
+from sqlalchemy import select, delete
+from redis.exceptions import RedisError
+from datetime import datetime
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL_SECONDS = 60 * 60
+PURGE_CHUNK_SIZE = 1000
+# A missing revocation mark only means "not revoked" for tokens issued
+# after redis started keeping the marks; a redis that lost its data would
+# forget every logout before that. Older tokens are checked in postgres,
+# which deletes the row on logout.
+TRACKING_KEY = 'refresh:revoked:since'
+CLOCK_SKEW_SECONDS = 60
+
+
+def revoked_key(token_hash: str) -> str:
+    return f'refresh:revoked:{token_hash}'
+
+
+async def revoke(token_hash: str, expires_at: datetime):
+    # the mark only has to outlive the token itself
+    ttl = int((expires_at - datetime.utcnow()).total_seconds())
+    if ttl > 0:
+        await redis_client.set(revoked_key(token_hash), 1, ex=ttl)
+
+
+async def is_revoked(token_hash: str, issued_at: float) -> Optional[bool]:
+    # None means redis could not answer and the caller has to ask postgres
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.exists(revoked_key(token_hash))
+            pipe.get(TRACKING_KEY)
+            revoked, since = await pipe.execute()
+        if since is None:
+            await redis_client.set(TRACKING_KEY, time.time(), nx=True)
+    except RedisError:
+        logger.warning('Revocation check fell back to postgres', exc_info=True)
+        return None
+
+    if revoked:
+        return True
+    if since is None or issued_at < float(since) + CLOCK_SKEW_SECONDS:
+        return None
+    return False
+
+
+async def purge_expired():
+    while True:
+        async with AsyncSessionLocal() as db:
+            expired = (
+                select(RefreshToken.id)
+                .where(RefreshToken.expires_at < datetime.utcnow())
+                .limit(PURGE_CHUNK_SIZE)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired)))
+            await db.commit()
+
+        # short transactions, so the purge never holds many row locks at once
+        if result.rowcount < PURGE_CHUNK_SIZE:
+            return
@@ -0,0 +1,82 @@
+import asyncio
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import Feedback, SellerReputation
+from sqlalchemy import select, update, delete, func, text, exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+
+RATINGS = range(1, 6)
+COUNTERS = ['feedback_count', 'rating_count', 'rating_sum'] + [f'rating_{rating}' for rating in RATINGS]
+
+
+def _deltas(rating: Optional[int], sign: int) -> dict:
+    deltas = dict.fromkeys(COUNTERS, 0)
+    deltas['feedback_count'] = sign
+    if rating is not None:
+        deltas['rating_count'] = sign
+        deltas['rating_sum'] = sign * rating
+        deltas[f'rating_{rating}'] = sign
+    return deltas
+
+
+# Both run in the caller's transaction, so the summary commits or rolls back
+# with the feedback row. The counters move by relative amounts and the row
+# lock taken by the upsert/update serializes writers for the same seller.
+async def feedback_added(db: AsyncSession, seller_id: int, rating: Optional[int]):
+    stmt = insert(SellerReputation).values(seller_id=seller_id, **_deltas(rating, 1))
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[SellerReputation.seller_id],
+        set_={name: getattr(SellerReputation, name) + stmt.excluded[name] for name in COUNTERS},
+    ))
+
+
+async def feedback_removed(db: AsyncSession, seller_id: int, rating: Optional[int]):
+    deltas = _deltas(rating, -1)
+    await db.execute(
+        update(SellerReputation)
+        .where(SellerReputation.seller_id == seller_id)
+        .values({name: getattr(SellerReputation, name) + delta for name, delta in deltas.items() if delta})
+    )
+
+
+def summary(seller_id: int, reputation: Optional[SellerReputation]) -> dict:
+    if reputation is None:
+        return {'seller_id': seller_id, 'histogram': dict.fromkeys(RATINGS, 0)}
+    return {
+        'seller_id': seller_id,
+        'feedback_count': reputation.feedback_count,
+        'rating_count': reputation.rating_count,
+        'average_rating': (round(reputation.rating_sum / reputation.rating_count, 2)
+                           if reputation.rating_count else None),
+        'histogram': {rating: getattr(reputation, f'rating_{rating}') for rating in RATINGS},
+    }
+
+
+async def backfill() -> int:
+    async with AsyncSessionLocal() as db:
+        # feedback writes wait for the recount instead of slipping between
+        # its snapshot and the overwrite
+        await db.execute(text('LOCK TABLE feedback IN SHARE MODE'))
+
+        totals = select(
+            Feedback.seller_id,
+            func.count(),
+            func.count(Feedback.rating),
+            func.coalesce(func.sum(Feedback.rating), 0),
+            *[func.count().filter(Feedback.rating == rating) for rating in RATINGS],
+        ).group_by(Feedback.seller_id)
+        stmt = insert(SellerReputation).from_select(['seller_id'] + COUNTERS, totals)
+        result = await db.execute(stmt.on_conflict_do_update(
+            index_elements=[SellerReputation.seller_id],
+            set_={name: stmt.excluded[name] for name in COUNTERS},
+        ))
+        await db.execute(delete(SellerReputation).where(
+            ~exists().where(Feedback.seller_id == SellerReputation.seller_id)))
+        await db.commit()
+        return result.rowcount
+
+
+if __name__ == '__main__':
+    print(f'Recounted reputation for {asyncio.run(backfill())} sellers')
@@ -0,0 +1,126 @@
+import logging
+from auction_app.db.models import Car, AuctionStatus
+from auction_app.db.redis_client import redis_client
+from auction_app.services.http_cache import etag_matches
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Request, Response
+from typing import Optional
+from redis.exceptions import RedisError
+
+
+logger = logging.getLogger(__name__)
+
+# Rendered detail responses, one redis hash per resource. Writes bump the
+# row's version, so the ETag changes with the body, and after commit they
+# replace the entry with a short-lived tombstone: a reader that loaded the
+# old row before the commit can't put it back, neither can a fill older
+# than the version already cached. The TTLs only bound what a missed write
+# could leave behind.
+CAR_SECONDS = 5 * 60
+LIVE_AUCTION_SECONDS = 5
+CLOSED_AUCTION_SECONDS = 60 * 60
+# longer than a detail read takes from its query to its store
+TOMBSTONE_SECONDS = 5
+# clients keep the body but ask every time, mostly getting a 304 back
+REVALIDATE = 'no-cache'
+CLOSED_AUCTION_CACHE_CONTROL = 'public, max-age=300'
+LIVE_STATUSES = (AuctionStatus.waiting, AuctionStatus.started)
+
+STORE = redis_client.register_script("""
+if redis.call('HEXISTS', KEYS[1], 'tombstone') == 1 then
+    return 0
+end
+local cached = tonumber(redis.call('HGET', KEYS[1], 'version'))
+if cached and cached >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'etag', ARGV[2], 'body', ARGV[3], 'cache_control', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+""")
+
+
+def car_key(car_id: int) -> str:
+    return f'response:car:{car_id}'
+
+
+def auction_key(auction_id: int) -> str:
+    return f'response:auction:{auction_id}'
+
+
+def etag(name: str, item_id: int, version: int) -> str:
+    return f'W/"{name}-{item_id}-v{version}"'
+
+
+def auction_policy(status: AuctionStatus) -> tuple:
+    if status in LIVE_STATUSES:
+        return LIVE_AUCTION_SECONDS, REVALIDATE
+    return CLOSED_AUCTION_SECONDS, CLOSED_AUCTION_CACHE_CONTROL
+
+
+async def cached(key: str) -> Optional[dict]:
+    try:
+        entry = await redis_client.hgetall(key)
+    except RedisError:
+        logger.warning('Could not read cached response %s', key, exc_info=True)
+        return None
+    if not entry or 'tombstone' in entry:
+        return None
+    return entry
+
+
+async def store(key: str, version: int, etag: str, body: bytes, cache_control: str, seconds: int) -> dict:
+    entry = {'etag': etag, 'body': body.decode(), 'cache_control': cache_control}
+    try:
+        await STORE(keys=[key], args=[version, etag, entry['body'], cache_control, seconds])
+    except RedisError:
+        logger.warning('Could not cache response %s', key, exc_info=True)
+    return entry
+
+
+def respond(request: Request, entry: dict) -> Response:
+    headers = {'ETag': entry['etag'], 'Cache-Control': entry['cache_control']}
+    if etag_matches(request, entry['etag']):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry['body'], media_type='application/json', headers=headers)
+
+
+async def invalidate(*keys: str):
+    if not keys:
+        return
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for key in keys:
+                pipe.delete(key)
+                pipe.hset(key, 'tombstone', 1)
+                pipe.expire(key, TOMBSTONE_SECONDS)
+            await pipe.execute()
+    except RedisError:
+        # the TTL retires the entry instead
+        logger.warning('Could not drop cached responses %s', keys, exc_info=True)
+
+
+async def touch_cars(db: AsyncSession, car_ids) -> list:
+    # for changes that live in other tables, like images; runs in the
+    # caller's transaction, invalidate after the commit
+    car_ids = list(set(car_ids))
+    if not car_ids:
+        return []
+    result = await db.execute(
+        update(Car)
+        .where(Car.id.in_(car_ids))
+        .values(version=Car.version + 1)
+        .returning(Car.id)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalars().all()
+
+
+async def forget_cars(car_ids):
+    await invalidate(*(car_key(car_id) for car_id in set(car_ids)))
+
+
+async def forget_auctions(auction_ids):
+    await invalidate(*(auction_key(auction_id) for auction_id in set(auction_ids)))
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from auction_app.db.database import AsyncSessionLocal
+from auction_app.db.models import Auction, AuctionStatus
+from auction_app.services import order_book, live_feed, response_cache
+from sqlalchemy import select, update, func, case, and_, or_
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+TICK_SECONDS = 1
+BATCH_SIZE = 500
+# any constant shared by all workers, only one of them runs a tick at a time
+ADVISORY_LOCK_KEY = 7_340_001
+
+
+async def periodic(job, interval: float):
+    while True:
+        try:
+            await job()
+        except Exception:
+            logger.exception('Periodic job %s failed', job.__name__)
+        await asyncio.sleep(interval)
+
+
+async def try_lock(db, key: int) -> bool:
+    # held until the transaction ends; other workers skip instead of waiting
+    return await db.scalar(select(func.pg_try_advisory_xact_lock(key)))
+
+
+def _due(status: AuctionStatus, deadline, now: datetime):
+    # rows a bid is holding right now are skipped and picked up next tick
+    return (
+        select(Auction.id)
+        .where(Auction.status == status, deadline <= now)
+        .order_by(deadline)
+        .limit(BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+
+async def _transition(db, now: datetime):
+    started = await db.execute(
+        update(Auction)
+        .where(Auction.id.in_(_due(AuctionStatus.waiting, Auction.start_time, now)))
+        .values(status=AuctionStatus.started)
+        .returning(Auction.id)
+        .execution_options(synchronize_session=False)
+    )
+    started = started.scalars().all()
+
+    # the leader only wins if the reserve price was reached
+    reserve_met = and_(Auction.current_price.is_not(None),
+                       or_(Auction.min_price.is_(None), Auction.current_price >= Auction.min_price))
+    completed = await db.execute(
+        update(Auction)
+        .where(Auction.id.in_(_due(AuctionStatus.started, Auction.end_time, now)))
+        .values(status=AuctionStatus.completed,
+                winner_id=case((reserve_met, Auction.current_winner_id), else_=None))
+        .returning(Auction.id, Auction.winner_id, Auction.current_price)
+        .execution_options(synchronize_session=False)
+    )
+    completed = completed.all()
+    return started, completed
+
+
+async def tick():
+    while True:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            if not await try_lock(db, ADVISORY_LOCK_KEY):
+                return
+            started, completed = await _transition(db, now)
+            await db.commit()
+
+        events = [(auction_id, {'type': 'status', 'status': AuctionStatus.started.value})
+                  for auction_id in started]
+        events += [(auction_id, {'type': 'status', 'status': AuctionStatus.completed.value,
+                                 'winner_id': winner_id,
+                                 'final_price': float(price) if price is not None else None})
+                   for auction_id, winner_id, price in completed]
+        await live_feed.publish_many(events)
+        await order_book.retire([auction_id for auction_id, _, _ in completed])
+        await response_cache.forget_auctions([*started, *(auction_id for auction_id, _, _ in completed)])
+
+        # keep draining while a backlog is left, e.g. after downtime
+        if len(started) < BATCH_SIZE and len(completed) < BATCH_SIZE:
+            return
@@ -0,0 +1,87 @@
+import mimetypes
+import os
+import tempfile
+from auction_app.config import (STORAGE_BACKEND, MEDIA_ROOT, MEDIA_URL, S3_BUCKET, S3_ENDPOINT_URL,
+                                S3_ACCESS_KEY, S3_SECRET_KEY, S3_PUBLIC_URL)
+
+
+# Blocking on purpose: callers run these on a thread pool, never on the loop.
+class LocalStorage:
+    def __init__(self, root: str, base_url: str):
+        self.root = root
+        self.base_url = base_url
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def save_file(self, key: str, path: str):
+        # uploads are spooled next to the media root, so this is a rename
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        os.replace(path, self.path(key))
+
+    def save_bytes(self, key: str, data: bytes):
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(self.path(key)), delete=False) as file:
+            file.write(data)
+        os.replace(file.name, self.path(key))
+
+    def open(self, key: str):
+        return open(self.path(key), 'rb')
+
+    def url(self, key: str) -> str:
+        return f'{self.base_url}{key}'
+
+
+class S3Storage:
+    def __init__(self, bucket: str, endpoint_url: str, access_key: str, secret_key: str, public_url: str):
+        # boto3 is only needed with this backend
+        import boto3
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip('/')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url,
+                                   aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return False
+            raise
+        return True
+
+    def _extra_args(self, key: str) -> dict:
+        content_type, _ = mimetypes.guess_type(key)
+        return {'ContentType': content_type or 'application/octet-stream'}
+
+    def save_file(self, key: str, path: str):
+        self.client.upload_file(path, self.bucket, key, ExtraArgs=self._extra_args(key))
+        os.remove(path)
+
+    def save_bytes(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **self._extra_args(key))
+
+    def open(self, key: str):
+        file = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        self.client.download_fileobj(self.bucket, key, file)
+        file.seek(0)
+        return file
+
+    def url(self, key: str) -> str:
+        return f'{self.public_url}/{key}'
+
+
+def make_storage():
+    if STORAGE_BACKEND == 's3':
+        return S3Storage(S3_BUCKET, S3_ENDPOINT_URL, S3_ACCESS_KEY, S3_SECRET_KEY,
+                         S3_PUBLIC_URL or f'{S3_ENDPOINT_URL}/{S3_BUCKET}')
+    return LocalStorage(MEDIA_ROOT, MEDIA_URL)
+
+
+storage = make_storage()
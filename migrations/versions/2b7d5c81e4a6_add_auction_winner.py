@@ -0,0 +1,37 @@
+"""add auction winner
+
+Revision ID: 2b7d5c81e4a6
+Revises: 9a4f1e2c7b30
+Create Date: 2026-10-18 11:48:55.217630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7d5c81e4a6'
+down_revision: Union[str, None] = '9a4f1e2c7b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('auction', sa.Column('winner_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('auction_winner_id_fkey', 'auction', 'user_profile',
+                          ['winner_id'], ['id'])
+    with op.get_context().autocommit_block():
+        op.create_index('ix_auction_status_start_time', 'auction', ['status', 'start_time'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_auction_status_start_time', table_name='auction',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_constraint('auction_winner_id_fkey', 'auction', type_='foreignkey')
+    op.drop_column('auction', 'winner_id')
@@ -0,0 +1,42 @@
+"""add car search indexes
+
+Revision ID: 4f6a0b93d1c7
+Revises: e81c0d3f95b2
+Create Date: 2026-10-18 14:02:17.318842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f6a0b93d1c7'
+down_revision: Union[str, None] = 'e81c0d3f95b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_car_price_id', 'car', ['price', 'id']),
+    ('ix_car_mileage_id', 'car', ['mileage', 'id']),
+    ('ix_car_brand_id_price_id', 'car', ['brand_id', 'price', 'id']),
+    ('ix_car_model_id_price_id', 'car', ['model_id', 'price', 'id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,40 @@
+"""add car search vector
+
+Revision ID: 7c2e58a0f4b9
+Revises: 4f6a0b93d1c7
+Create Date: 2026-10-18 14:47:52.905126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e58a0f4b9'
+down_revision: Union[str, None] = '4f6a0b93d1c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # a stored generated column rewrites car once, under an exclusive lock
+    op.add_column('car', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', coalesce(description, ''))", persisted=True),
+        nullable=False))
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_car_search_vector', 'car', ['search_vector'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_car_search_vector', table_name='car',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('car', 'search_vector')
@@ -0,0 +1,34 @@
+"""add car and auction version
+
+Revision ID: 8f2c4e6a1b39
+Revises: d1f7a3c9e024
+Create Date: 2026-10-18 18:05:41.207316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2c4e6a1b39'
+down_revision: Union[str, None] = 'd1f7a3c9e024'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # constant and now() defaults are stored once, the tables aren't rewritten
+    for table in ('car', 'auction'):
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       server_default=sa.text("(now() at time zone 'utc')"), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('auction', 'car'):
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'version')
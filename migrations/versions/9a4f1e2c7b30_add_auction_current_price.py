@@ -0,0 +1,44 @@
+"""add auction current price
+
+Revision ID: 9a4f1e2c7b30
+Revises: c3966d695809
+Create Date: 2026-10-18 11:02:17.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f1e2c7b30'
+down_revision: Union[str, None] = 'c3966d695809'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('auction', sa.Column('current_price', sa.DECIMAL(precision=10, scale=2), nullable=True))
+    op.add_column('auction', sa.Column('current_winner_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('auction_current_winner_id_fkey', 'auction', 'user_profile',
+                          ['current_winner_id'], ['id'])
+
+    # seed the denormalized leader from the bids placed so far
+    op.execute("""
+        UPDATE auction SET current_price = top.amount, current_winner_id = top.buyer_id
+        FROM (
+            SELECT DISTINCT ON (auction_id) auction_id, amount, buyer_id
+            FROM bid
+            ORDER BY auction_id, amount DESC, id
+        ) AS top
+        WHERE top.auction_id = auction.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('auction_current_winner_id_fkey', 'auction', type_='foreignkey')
+    op.drop_column('auction', 'current_winner_id')
+    op.drop_column('auction', 'current_price')
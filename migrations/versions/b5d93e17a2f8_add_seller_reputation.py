@@ -0,0 +1,47 @@
+"""add seller reputation
+
+Revision ID: b5d93e17a2f8
+Revises: 7c2e58a0f4b9
+Create Date: 2026-10-18 15:36:40.218377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d93e17a2f8'
+down_revision: Union[str, None] = '7c2e58a0f4b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COUNTERS = ['feedback_count', 'rating_count', 'rating_sum'] + [f'rating_{rating}' for rating in range(1, 6)]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'seller_reputation',
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        *[sa.Column(name, sa.Integer(), nullable=False) for name in COUNTERS],
+        sa.ForeignKeyConstraint(['seller_id'], ['user_profile.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('seller_id'),
+    )
+    op.execute("""
+        INSERT INTO seller_reputation (seller_id, feedback_count, rating_count, rating_sum,
+                                       rating_1, rating_2, rating_3, rating_4, rating_5)
+        SELECT seller_id, count(*), count(rating), coalesce(sum(rating), 0),
+               count(*) FILTER (WHERE rating = 1), count(*) FILTER (WHERE rating = 2),
+               count(*) FILTER (WHERE rating = 3), count(*) FILTER (WHERE rating = 4),
+               count(*) FILTER (WHERE rating = 5)
+        FROM feedback
+        GROUP BY seller_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('seller_reputation')
@@ -0,0 +1,53 @@
+"""add lookup indexes
+
+Revision ID: c3966d695809
+Revises: 5e3991f85319
+Create Date: 2026-10-18 10:12:41.530118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3966d695809'
+down_revision: Union[str, None] = '5e3991f85319'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_refresh_token_token', 'refresh_token', ['token']),
+    ('ix_refresh_token_user_id', 'refresh_token', ['user_id']),
+    ('ix_model_brand_id', 'model', ['brand_id']),
+    ('ix_car_brand_id', 'car', ['brand_id']),
+    ('ix_car_model_id', 'car', ['model_id']),
+    ('ix_car_seller_id', 'car', ['seller_id']),
+    ('ix_car_image_car_id', 'car_image', ['car_id']),
+    ('ix_auction_car_id', 'auction', ['car_id']),
+    ('ix_auction_status_end_time', 'auction', ['status', 'end_time']),
+    ('ix_bid_auction_id_amount', 'bid', ['auction_id', sa.text('amount DESC')]),
+    ('ix_bid_buyer_id', 'bid', ['buyer_id']),
+    ('ix_feedback_seller_id', 'feedback', ['seller_id']),
+    ('ix_feedback_buyer_id', 'feedback', ['buyer_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps the tables writable while the indexes build,
+    # it can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,37 @@
+"""add car image content hash
+
+Revision ID: d1f7a3c9e024
+Revises: b5d93e17a2f8
+Create Date: 2026-10-18 16:20:03.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f7a3c9e024'
+down_revision: Union[str, None] = 'b5d93e17a2f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('car_image', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('car_image', sa.Column('has_thumbnails', sa.Boolean(), server_default=sa.false(),
+                                         nullable=False))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_car_image_content_hash', 'car_image', ['content_hash'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_car_image_content_hash', table_name='car_image',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('car_image', 'has_thumbnails')
+    op.drop_column('car_image', 'content_hash')
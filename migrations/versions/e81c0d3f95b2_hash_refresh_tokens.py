@@ -0,0 +1,58 @@
+"""hash refresh tokens
+
+Revision ID: e81c0d3f95b2
+Revises: 2b7d5c81e4a6
+Create Date: 2026-10-18 12:31:09.664173
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81c0d3f95b2'
+down_revision: Union[str, None] = '2b7d5c81e4a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('refresh_token', sa.Column('token_hash', sa.String(length=64), nullable=True))
+    op.add_column('refresh_token', sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    # expired rows are not worth carrying over
+    op.execute("DELETE FROM refresh_token WHERE created_date < (now() at time zone 'utc') - interval '3 days'")
+    op.execute("""
+        UPDATE refresh_token
+        SET token_hash = encode(sha256(convert_to(token, 'UTF8')), 'hex'),
+            expires_at = created_date + interval '3 days'
+    """)
+
+    # logins within the same second used to get byte-identical tokens,
+    # one row per token is enough for the unique index
+    op.execute("""
+        DELETE FROM refresh_token
+        WHERE id NOT IN (SELECT min(id) FROM refresh_token GROUP BY token_hash)
+    """)
+
+    op.alter_column('refresh_token', 'token_hash', nullable=False)
+    op.alter_column('refresh_token', 'expires_at', nullable=False)
+    op.create_index('ix_refresh_token_token_hash', 'refresh_token', ['token_hash'], unique=True)
+    op.create_index('ix_refresh_token_expires_at', 'refresh_token', ['expires_at'], unique=False)
+    op.drop_index('ix_refresh_token_token', table_name='refresh_token')
+    op.drop_column('refresh_token', 'token')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # raw tokens can't be recovered from their hashes, everyone logs in again
+    op.execute('DELETE FROM refresh_token')
+    op.add_column('refresh_token', sa.Column('token', sa.String(), nullable=False))
+    op.create_index('ix_refresh_token_token', 'refresh_token', ['token'], unique=False)
+    op.drop_index('ix_refresh_token_expires_at', table_name='refresh_token')
+    op.drop_index('ix_refresh_token_token_hash', table_name='refresh_token')
+    op.drop_column('refresh_token', 'expires_at')
+    op.drop_column('refresh_token', 'token_hash')
@@ -0,0 +1,102 @@
+# Per request cost of MetricsMiddleware and the SQL profiler, measured on the
+# sqlite/fakeredis harness through the whole app in process. Not part of the
+# normal test run:
+#
+#   python -m pytest tests/benchmarks/bench_instrumentation.py -s
+#
+# BENCH_REQUESTS sets the requests per endpoint and setup (default 300).
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from auction_app import instrumentation
+from auction_app.db import profiler
+from auction_app.db.models import Car, CarImage
+from auction_app.main import auction_app
+from sqlalchemy import event
+from starlette.middleware import Middleware
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+REQUESTS = int(os.getenv('BENCH_REQUESTS', 300))
+WARMUP = 20
+ROUNDS = 10
+HOOKS = {
+    'metrics': (instrumentation._query_started, instrumentation._query_finished),
+    'profiler': (profiler._before, profiler._after),
+}
+
+
+@contextmanager
+def instrumented(engine, metrics: bool, profiled: bool):
+    # rebuilds the app's middleware stack with just the wanted layers and
+    # hooks the SQL listeners onto the test engine
+    original = list(auction_app.user_middleware)
+    layers = [layer for layer in original
+              if layer.cls not in (instrumentation.MetricsMiddleware, profiler.ProfilerMiddleware)]
+    hooks = []
+    if profiled:
+        layers.insert(0, Middleware(profiler.ProfilerMiddleware))
+        hooks += HOOKS['profiler']
+    if metrics:
+        # outermost, as in main
+        layers.insert(0, Middleware(instrumentation.MetricsMiddleware))
+        hooks += HOOKS['metrics']
+
+    for before, after in HOOKS.values():
+        if event.contains(engine.sync_engine, 'before_cursor_execute', before):
+            event.remove(engine.sync_engine, 'before_cursor_execute', before)
+            event.remove(engine.sync_engine, 'after_cursor_execute', after)
+    for before, after in zip(hooks[::2], hooks[1::2]):
+        event.listen(engine.sync_engine, 'before_cursor_execute', before)
+        event.listen(engine.sync_engine, 'after_cursor_execute', after)
+    auction_app.user_middleware = layers
+    auction_app.middleware_stack = None
+    try:
+        yield
+    finally:
+        auction_app.user_middleware = original
+        auction_app.middleware_stack = None
+
+
+async def timings(client, url: str, requests: int) -> list:
+    seconds = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        assert (await client.get(url)).status_code == 200
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+async def test_instrumentation_overhead(client, engine, sessions, listing):
+    async with sessions() as db:
+        cars = [Car(brand_id=listing['brand_id'], model_id=listing['model_id'], description=f'Car {i}',
+                    fuel_type='gas', transmission='auto', mileage=1000 + i, price=5000 + i,
+                    seller_id=listing['seller_id']) for i in range(40)]
+        db.add_all(cars)
+        await db.flush()
+        db.add_all([CarImage(car_id=car.id, car_image=f'http://example.com/{car.id}/{i}.jpg')
+                    for car in cars for i in range(3)])
+        await db.commit()
+
+    setups = {'off': (False, False), 'metrics': (True, False), 'metrics+profiler': (True, True)}
+    # a page with two queries, and a detail answered from the redis cache
+    urls = ['/car/?limit=20', f"/car/{listing['car_id']}/"]
+    print(f'\n{REQUESTS} sequential requests per setup, median / p95 in ms')
+    for url in urls:
+        await timings(client, url, WARMUP)
+        seconds = {name: [] for name in setups}
+        # setups take turns, so drift over the run hits them all alike
+        for _ in range(ROUNDS):
+            for name, (metrics, profiled) in setups.items():
+                with instrumented(engine, metrics, profiled):
+                    seconds[name] += await timings(client, url, REQUESTS // ROUNDS)
+
+        baseline = statistics.median(seconds['off'])
+        for name, times in seconds.items():
+            times.sort()
+            median = statistics.median(times)
+            print(f'{url:<16} {name:<17} {median * 1000:6.3f} / {times[int(0.95 * (len(times) - 1))] * 1000:6.3f}'
+                  f'  {(median - baseline) * 1e6:+5.0f} us')
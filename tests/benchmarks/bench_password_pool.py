@@ -0,0 +1,92 @@
+# Throughput and latency of password hashing, straight on the event loop
+# versus through PasswordPool. Not part of the normal test run:
+#
+#   python -m pytest tests/benchmarks/bench_password_pool.py -s
+#
+# BENCH_HASHES sets how many logins arrive at once (default 8).
+import asyncio
+import os
+import statistics
+import time
+from auction_app.api.auth import password_context
+from auction_app.services.password_pool import PasswordPool
+from fastapi import HTTPException
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+HASHES = int(os.getenv('BENCH_HASHES', 8))
+WORKERS = os.cpu_count() or 2
+
+
+async def loop_lag(stop: asyncio.Event, lags: list):
+    # how late a 5 ms sleep wakes up, i.e. how long other requests would wait
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - started - 0.005)
+
+
+async def measure(name: str, hash_one) -> dict:
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(loop_lag(stop, lags))
+    await asyncio.sleep(0)
+
+    # every login arrives at once, latency counts from there
+    started = time.perf_counter()
+
+    async def login():
+        await hash_one()
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(login() for _ in range(HASHES)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    latencies.sort()
+    result = {
+        'hashes/s': HASHES / elapsed,
+        'p50 ms': statistics.median(latencies) * 1000,
+        'p95 ms': latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        'max loop lag ms': max(lags, default=elapsed) * 1000,
+    }
+    print(f'{name:<12}', '  '.join(f'{key} {value:8.1f}' for key, value in result.items()))
+    return result
+
+
+async def test_pool_keeps_the_loop_free():
+    pool = PasswordPool(WORKERS, max_pending=HASHES)
+
+    async def on_loop():
+        password_context.hash('correct horse battery staple')
+
+    async def in_pool():
+        await pool.run(password_context.hash, 'correct horse battery staple')
+
+    print(f'\n{HASHES} concurrent hashes, {WORKERS} workers')
+    direct = await measure('event loop', on_loop)
+    pooled = await measure('pool', in_pool)
+    pool.executor.shutdown()
+
+    # the loop stalls for a whole hash at a time without the pool
+    assert pooled['max loop lag ms'] < direct['max loop lag ms']
+
+
+async def test_pool_sheds_load_beyond_max_pending():
+    pool = PasswordPool(WORKERS, max_pending=WORKERS)
+    outcomes = []
+
+    async def login():
+        try:
+            await pool.run(password_context.hash, 'correct horse battery staple')
+            outcomes.append(200)
+        except HTTPException as error:
+            outcomes.append(error.status_code)
+
+    await asyncio.gather(*(login() for _ in range(HASHES)))
+    pool.executor.shutdown()
+    print(f'\n{HASHES} logins, room for {WORKERS}: {outcomes.count(503)} refused with 503')
+    assert outcomes.count(503) == pool.rejected == HASHES - WORKERS
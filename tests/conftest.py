@@ -0,0 +1,120 @@
+import os
+
+
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+import fakeredis
+import pytest
+import auction_app.db.redis_client as redis_module
+
+# swapped in before the services import the client and register their scripts
+redis_server = fakeredis.FakeServer()
+redis_module.redis_client = fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+
+import httpx
+from datetime import datetime, timedelta
+from auction_app.db import database, profiler
+from auction_app.db.database import Base, get_db
+from auction_app.db.models import UserProfile, Brand, Model, Car, Auction, AuctionStatus
+from auction_app.main import auction_app
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import NullPool
+
+
+# a scratch postgres database (postgresql+asyncpg://...) when set, sqlite otherwise;
+# row locking and the search columns only really get tested on postgres
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+SESSION_MODULES = ('auction_app.main', 'auction_app.api.auction', 'auction_app.api.bulk',
+                   'auction_app.db.streaming', 'auction_app.services.images',
+                   'auction_app.services.reputation', 'auction_app.services.refresh_tokens',
+                   'auction_app.services.scheduler', 'auction_app.services.car_facets')
+
+
+@compiles(TSVECTOR, 'sqlite')
+def _tsvector_on_sqlite(type_, compiler, **kw):
+    return 'TEXT'
+
+
+def _sqlite_functions(dbapi_connection, connection_record):
+    dbapi_connection.create_function('to_tsvector', 2, lambda config, text: text, deterministic=True)
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture(autouse=True)
+def empty_redis():
+    fakeredis.FakeRedis(server=redis_server).flushall()
+
+
+@pytest.fixture
+async def engine(tmp_path, monkeypatch):
+    engine = create_async_engine(TEST_DATABASE_URL or f'sqlite+aiosqlite:///{tmp_path / "test.db"}',
+                                 poolclass=NullPool)
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', _sqlite_functions)
+        # (now() at time zone 'utc') is postgres only
+        for table in ('car', 'auction'):
+            monkeypatch.setattr(Base.metadata.tables[table].c.updated_at, 'server_default', None)
+    event.listen(engine.sync_engine, 'before_cursor_execute', profiler._before)
+    event.listen(engine.sync_engine, 'after_cursor_execute', profiler._after)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def sessions(engine, monkeypatch):
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    monkeypatch.setattr(database, 'AsyncSessionLocal', sessions)
+    for module in SESSION_MODULES:
+        monkeypatch.setattr(f'{module}.AsyncSessionLocal', sessions)
+    return sessions
+
+
+@pytest.fixture
+async def client(sessions):
+    async def override_get_db():
+        async with sessions() as db:
+            yield db
+
+    auction_app.dependency_overrides[get_db] = override_get_db
+    # in process and in the test's own task, so profiler.profile() sees the queries
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=auction_app),
+                                 base_url='http://test') as client:
+        yield client
+    auction_app.dependency_overrides.pop(get_db)
+
+
+@pytest.fixture
+async def listing(sessions):
+    # a seller, a few buyers and one car up for auction right now
+    async with sessions() as db:
+        users = [UserProfile(username=f'user{i}', first_name='Test', password='x', email=f'user{i}@example.com',
+                             role='seller' if i == 0 else 'buyer') for i in range(6)]
+        brand = Brand(brand_name='Toyota')
+        db.add_all([*users, brand])
+        await db.flush()
+        model = Model(model_name='Corolla', brand_id=brand.id)
+        db.add(model)
+        await db.flush()
+        car = Car(brand_id=brand.id, model_id=model.id, description='Clean', fuel_type='gas',
+                  transmission='auto', mileage=1000, price=5000, seller_id=users[0].id)
+        db.add(car)
+        await db.flush()
+        now = datetime.utcnow()
+        auction = Auction(car_id=car.id, start_price=100, start_time=now - timedelta(hours=1),
+                          end_time=now + timedelta(hours=1), status=AuctionStatus.started)
+        db.add(auction)
+        await db.commit()
+        return {'seller_id': users[0].id, 'buyer_ids': [user.id for user in users[1:]],
+                'brand_id': brand.id, 'model_id': model.id, 'car_id': car.id, 'auction_id': auction.id}
@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timedelta
+from auction_app.api import auth
+from auction_app.api.auth import create_access_token, create_refresh_token
+from auction_app.db.models import UserProfile, RefreshToken
+from auction_app.db.profiler import profile
+from auction_app.services import refresh_tokens
+from sqlalchemy import select
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def empty_user_cache():
+    auth.user_cache.clear()
+    yield
+    auth.user_cache.clear()
+
+
+def bearer(token: str) -> dict:
+    return {'Authorization': f'Bearer {token}'}
+
+
+async def bid(client, listing, token: str):
+    # below the start price: a 400 once the user is known, nothing is stored
+    return await client.post('/bid/', json={'auction_id': listing['auction_id'], 'amount': 1},
+                             headers=bearer(token))
+
+
+async def test_refresh_token_is_not_a_bearer_token(client, listing):
+    assert (await bid(client, listing, create_access_token({'sub': 'user1'}))).status_code == 400
+    assert (await bid(client, listing, create_refresh_token({'sub': 'user1'}))).status_code == 401
+
+
+async def test_deleted_user_loses_access(client, listing):
+    token = create_access_token({'sub': 'user1'})
+    assert (await bid(client, listing, token)).status_code == 400
+    assert len(auth.user_cache) == 1
+
+    assert (await client.delete(f"/user/{listing['buyer_ids'][0]}/")).status_code == 200
+    assert (await bid(client, listing, token)).status_code == 401
+
+
+async def test_renamed_user_loses_access(client, listing):
+    token = create_access_token({'sub': 'user1'})
+    assert (await bid(client, listing, token)).status_code == 400
+
+    profile = {'username': 'renamed', 'first_name': 'Test', 'last_name': None, 'password': 'x',
+               'email': 'user1@example.com', 'phone_number': None, 'profile_image': 'me.jpg', 'role': 'buyer'}
+    assert (await client.put(f"/user/{listing['buyer_ids'][0]}/", json=profile)).status_code == 200
+    assert (await bid(client, listing, token)).status_code == 401
+    assert (await bid(client, listing, create_access_token({'sub': 'renamed'}))).status_code == 400
+
+
+@pytest.fixture
+async def tokens(client, sessions, listing):
+    async with sessions() as db:
+        user = await db.get(UserProfile, listing['buyer_ids'][0])
+        user.password = auth.password_context.hash('secret')
+        await db.commit()
+    response = await client.post('/auth/login/', params={'email': user.email, 'password': 'secret'})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def refresh(client, token: str):
+    return await client.post('/auth/refresh/', params={'refresh_token': token})
+
+
+async def test_refresh_swaps_only_refresh_tokens(client, tokens):
+    assert (await refresh(client, tokens['refresh'])).status_code == 200
+    assert (await refresh(client, tokens['access'])).status_code == 401
+
+
+async def test_logged_out_token_is_refused(client, tokens):
+    assert (await client.post('/auth/logout/', params={'token': tokens['refresh']})).status_code == 200
+    assert await refresh_tokens.redis_client.exists(refresh_tokens.revoked_key(auth.token_hash(tokens['refresh'])))
+    assert (await refresh(client, tokens['refresh'])).status_code == 404
+
+
+async def test_logged_out_token_is_refused_after_redis_lost_its_data(client, tokens):
+    assert (await client.post('/auth/logout/', params={'token': tokens['refresh']})).status_code == 200
+    await refresh_tokens.redis_client.flushall()
+    with profile() as request_profile:
+        assert (await refresh(client, tokens['refresh'])).status_code == 404
+    # answered by postgres
+    assert request_profile.statements == 1
+
+
+async def test_refresh_skips_postgres_for_tokens_redis_has_tracked(client, sessions, listing):
+    await refresh_tokens.redis_client.set(refresh_tokens.TRACKING_KEY,
+                                          time.time() - 2 * refresh_tokens.CLOCK_SKEW_SECONDS)
+    token = create_refresh_token({'sub': 'user1'})
+    async with sessions() as db:
+        db.add(RefreshToken(token_hash=auth.token_hash(token), user_id=listing['buyer_ids'][0],
+                            expires_at=datetime.utcnow() + timedelta(days=1)))
+        await db.commit()
+    with profile() as request_profile:
+        assert (await refresh(client, token)).status_code == 200
+    assert request_profile.statements == 0
+
+
+async def test_purge_removes_only_expired_tokens(sessions, listing):
+    now = datetime.utcnow()
+    async with sessions() as db:
+        db.add_all([RefreshToken(token_hash=f'{i:064}', user_id=listing['buyer_ids'][0],
+                                 expires_at=now + timedelta(hours=hours))
+                    for i, hours in enumerate((-48, -1, 1, 48))])
+        await db.commit()
+
+    await refresh_tokens.purge_expired()
+    async with sessions() as db:
+        left = await db.scalars(select(RefreshToken.expires_at).order_by(RefreshToken.expires_at))
+        assert left.all() == [now + timedelta(hours=1), now + timedelta(hours=48)]
@@ -0,0 +1,60 @@
+import asyncio
+import random
+from decimal import Decimal
+from auction_app.db.models import Auction, Bid
+from auction_app.db.schema import BidCreateSchema
+from auction_app.services.bidding import place_bid
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import select, func
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize('amount', [0, -5, 0.001, '12.345', 123456789])
+def test_bid_amount_must_fit_the_column(amount):
+    with pytest.raises(ValidationError):
+        BidCreateSchema(auction_id=1, amount=amount)
+
+
+def test_bid_amount_keeps_cents():
+    assert BidCreateSchema(auction_id=1, amount=100.1).amount == Decimal('100.1')
+
+
+async def test_sub_cent_bid_is_rejected(sessions, listing):
+    async with sessions() as db:
+        with pytest.raises(HTTPException) as error:
+            await place_bid(db, listing['auction_id'], listing['buyer_ids'][0], 0.004)
+    assert error.value.status_code == 400
+
+
+async def test_concurrent_bids_leave_the_highest_in_the_lead(sessions, listing):
+    auction_id = listing['auction_id']
+    rng = random.Random(5)
+    bids = [(rng.choice(listing['buyer_ids']), Decimal(rng.randrange(10_000, 100_000)) / 100)
+            for _ in range(40)]
+    accepted = []
+
+    async def bid(buyer_id, amount):
+        async with sessions() as db:
+            try:
+                accepted.append(await place_bid(db, auction_id, buyer_id, amount))
+            except HTTPException as error:
+                assert error.status_code == 400
+
+    await asyncio.gather(*(bid(buyer_id, amount) for buyer_id, amount in bids))
+
+    best_buyer, best_amount = max(bids, key=lambda bid: bid[1])
+    async with sessions() as db:
+        auction = await db.get(Auction, auction_id)
+        stored = (await db.execute(select(func.count(Bid.id), func.max(Bid.amount))
+                                   .where(Bid.auction_id == auction_id))).one()
+    assert Decimal(str(auction.current_price)) == best_amount
+    assert auction.current_winner_id == best_buyer
+    assert stored[0] == len(accepted)
+    assert Decimal(str(stored[1])) == best_amount
+    # every accepted bid raised the price, so they arrive in increasing order
+    amounts = [Decimal(str(bid.amount)) for bid in sorted(accepted, key=lambda bid: bid.id)]
+    assert amounts == sorted(amounts)
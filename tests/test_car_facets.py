@@ -0,0 +1,40 @@
+from auction_app.services import car_facets, scheduler
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def rebuilds(sessions, monkeypatch):
+    # GROUPING SETS and advisory locks are postgres only
+    calls = []
+
+    async def rebuild(db):
+        calls.append(db)
+
+    monkeypatch.setattr(car_facets, 'rebuild', rebuild)
+    return calls
+
+
+async def test_reconcile_runs_once_per_interval(rebuilds, monkeypatch):
+    async def locked(db, key):
+        return True
+
+    monkeypatch.setattr(scheduler, 'try_lock', locked)
+    await car_facets.reconcile()
+    await car_facets.reconcile()
+    assert len(rebuilds) == 1
+
+    await car_facets.redis_client.delete(car_facets.RECONCILED_KEY)
+    await car_facets.reconcile()
+    assert len(rebuilds) == 2
+
+
+async def test_reconcile_skips_while_another_worker_holds_the_lock(rebuilds, monkeypatch):
+    async def taken(db, key):
+        return False
+
+    monkeypatch.setattr(scheduler, 'try_lock', taken)
+    await car_facets.reconcile()
+    assert rebuilds == []
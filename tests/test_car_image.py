@@ -0,0 +1,63 @@
+import asyncio
+import io
+import os
+from auction_app import config
+from auction_app.services import images
+from auction_app.services.storage import storage
+from PIL import Image
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'root', str(tmp_path / 'media'))
+    monkeypatch.setattr(images, 'UPLOAD_TMP_DIR', str(tmp_path / 'media_tmp'))
+    return tmp_path
+
+
+def png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def spooled(media) -> list:
+    return os.listdir(media / 'media_tmp')
+
+
+async def upload(client, car_id: int, body: bytes):
+    return await client.post('/car_image/upload/', params={'car_id': car_id}, content=body,
+                             headers={'Content-Type': 'image/png'})
+
+
+def test_uploads_are_spooled_outside_the_media_root():
+    media_root = os.path.abspath(config.MEDIA_ROOT)
+    assert os.path.commonpath([media_root, os.path.abspath(config.UPLOAD_TMP_DIR)]) != media_root
+
+
+async def test_upload_moves_the_file_into_storage(client, listing, media):
+    response = await upload(client, listing['car_id'], png())
+    assert response.status_code == 200
+    assert spooled(media) == []
+    assert os.listdir(media / 'media' / 'originals')
+    await asyncio.gather(*images.tasks)
+
+
+@pytest.mark.parametrize('car, body, status', [('missing', png(), 404), ('listed', b'not an image', 400)])
+async def test_rejected_upload_leaves_no_temp_file(client, listing, media, car, body, status):
+    car_id = listing['car_id'] if car == 'listed' else listing['car_id'] + 1
+    assert (await upload(client, car_id, body)).status_code == status
+    assert spooled(media) == []
+
+
+async def test_failed_store_leaves_no_temp_file(client, listing, media, monkeypatch):
+    def broken(key, path):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(storage, 'save_file', broken)
+    with pytest.raises(OSError):
+        await upload(client, listing['car_id'], png())
+    assert spooled(media) == []
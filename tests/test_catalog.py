@@ -0,0 +1,58 @@
+import asyncio
+from auction_app.db.models import Brand
+from auction_app.services import catalog
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def empty_local_cache():
+    catalog.local_cache.clear()
+    yield
+    catalog.local_cache.clear()
+
+
+async def test_brand_list_revalidates(client, listing):
+    response = await client.get('/brand/')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert (await client.get('/brand/', headers={'If-None-Match': etag})).status_code == 304
+
+
+async def test_etag_follows_the_content(client, sessions, listing):
+    etag = (await client.get('/brand/')).headers['ETag']
+    async with sessions() as db:
+        db.add(Brand(brand_name='Honda'))
+        await db.commit()
+    await catalog.invalidate()
+
+    response = await client.get('/brand/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+async def test_lost_version_counter_does_not_bring_back_old_etags(client, sessions, listing):
+    etag = (await client.get('/brand/')).headers['ETag']
+    async with sessions() as db:
+        db.add(Brand(brand_name='Honda'))
+        await db.commit()
+    # redis restarted without persistence, the counter and cached rows are gone
+    await catalog.redis_client.flushall()
+    catalog.local_cache.clear()
+
+    response = await client.get('/brand/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [brand['brand_name'] for brand in response.json()] == ['Toyota', 'Honda']
+
+
+async def test_version_counter_restarts_above_old_versions():
+    await catalog.version()
+    await catalog.invalidate()
+    old = await catalog.version()
+
+    await asyncio.sleep(0.01)
+    await catalog.redis_client.delete(catalog.VERSION_KEY)
+    catalog.local_cache.clear()
+    assert await catalog.version() > old
@@ -0,0 +1,47 @@
+from auction_app.services import order_book
+from redis.exceptions import ConnectionError
+from auction_app.services.bidding import place_bid
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def bid_twice(sessions, listing):
+    for buyer_id, amount in zip(listing['buyer_ids'], (150, 175)):
+        async with sessions() as db:
+            await place_bid(db, listing['auction_id'], buyer_id, amount)
+
+
+async def test_leaderboard_comes_from_the_book(client, sessions, listing):
+    await bid_twice(sessions, listing)
+    response = await client.get(f"/auction/{listing['auction_id']}/leaderboard/")
+    assert response.status_code == 200
+    assert response.json()['current_price'] == 175
+    assert [bid['amount'] for bid in response.json()['bids']] == [175, 150]
+
+
+@pytest.mark.parametrize('url', ['/car/{car_id}/', '/user/{seller_id}/'])
+async def test_cascaded_auctions_lose_their_book(client, sessions, listing, url):
+    await bid_twice(sessions, listing)
+    assert await order_book.redis_client.exists(order_book.bids_key(listing['auction_id']))
+
+    assert (await client.delete(url.format(**listing))).status_code == 200
+    assert not await order_book.redis_client.exists(order_book.bids_key(listing['auction_id']),
+                                                    order_book.price_key(listing['auction_id']))
+    assert (await client.get(f"/auction/{listing['auction_id']}/")).status_code == 404
+    assert (await client.get(f"/auction/{listing['auction_id']}/leaderboard/")).status_code == 404
+
+
+async def test_leaderboard_falls_back_to_postgres(client, sessions, listing, monkeypatch):
+    await bid_twice(sessions, listing)
+
+    async def redis_down(auction_id):
+        raise ConnectionError('redis is down')
+
+    monkeypatch.setattr(order_book, '_read', redis_down)
+    response = await client.get(f"/auction/{listing['auction_id']}/leaderboard/")
+    assert response.status_code == 200
+    assert response.json()['current_price'] == 175
+    bids = [(bid['buyer_id'], bid['amount']) for bid in response.json()['bids']]
+    assert bids == [(listing['buyer_ids'][1], 175), (listing['buyer_ids'][0], 150)]
@@ -0,0 +1,18 @@
+import base64
+from decimal import Decimal
+from auction_app.db.models import Car
+from auction_app.db.pagination import decode_cursor, encode_cursor
+from fastapi import HTTPException
+import pytest
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(['12.50', 3]), [Car.price, Car.id]) == [Decimal('12.50'), 3]
+
+
+@pytest.mark.parametrize('raw', [b'["abc", 1]', b'["NaN", 1]', b'[Infinity, 1]', b'[1]', b'{}', b'not json'])
+def test_bad_cursor_is_a_client_error(raw):
+    cursor = base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, [Car.price, Car.id])
+    assert error.value.status_code == 400
@@ -0,0 +1,37 @@
+from auction_app.db.profiler import fingerprint, profile, check, QueryBudgetExceeded
+import auction_app.db.profiler as profiler
+import pytest
+
+
+def test_fingerprint_collapses_literals_and_placeholders():
+    assert (fingerprint("SELECT * FROM car WHERE id = 5 AND fuel_type = 'gas'")
+            == fingerprint("SELECT * FROM car WHERE id = 17 AND fuel_type = 'diesel'")
+            == 'SELECT * FROM car WHERE id = ? AND fuel_type = ?')
+    assert fingerprint('SELECT * FROM car WHERE id = %(id_1)s') == 'SELECT * FROM car WHERE id = ?'
+    assert fingerprint('SELECT * FROM car WHERE id = $1') == 'SELECT * FROM car WHERE id = ?'
+
+
+def test_fingerprint_collapses_in_lists_of_any_length():
+    short = 'SELECT * FROM car_image WHERE car_id IN (%(car_id_1_1)s, %(car_id_1_2)s)'
+    long = 'SELECT * FROM car_image WHERE car_id IN (1, 2, 3, 4, 5)'
+    assert fingerprint(short) == fingerprint(long) == 'SELECT * FROM car_image WHERE car_id IN (?, ...)'
+
+
+def test_fingerprint_strips_asyncpg_casts():
+    two = 'SELECT * FROM car_image WHERE car_id IN ($1::INTEGER, $2::INTEGER)'
+    three = 'SELECT * FROM car_image WHERE car_id IN ($1::INTEGER, $2::INTEGER, $3::INTEGER)'
+    assert fingerprint(two) == fingerprint(three) == 'SELECT * FROM car_image WHERE car_id IN (?, ...)'
+    assert (fingerprint('UPDATE auction SET end_time = $1::TIMESTAMP WITHOUT TIME ZONE, '
+                        'current_price = $2::NUMERIC(10, 2), tags = $3::VARCHAR[] WHERE id = $4::INTEGER')
+            == 'UPDATE auction SET end_time = ?, current_price = ?, tags = ? WHERE id = ?')
+
+
+def test_check_enforces_budget_in_strict_mode(monkeypatch):
+    monkeypatch.setattr(profiler, 'SQL_PROFILER_STRICT', True)
+    with profile() as request_profile:
+        request_profile.statements = profiler.QUERY_BUDGETS['GET /car/'] + 1
+    with pytest.raises(QueryBudgetExceeded):
+        check('GET /car/', request_profile)
+
+    request_profile.statements = profiler.QUERY_BUDGETS['GET /car/']
+    check('GET /car/', request_profile)
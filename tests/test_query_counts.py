@@ -0,0 +1,43 @@
+from auction_app.db.models import Car, CarImage
+from auction_app.db.profiler import profile, QUERY_BUDGETS
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_cars(sessions, listing, count: int, images_per_car: int) -> list:
+    async with sessions() as db:
+        cars = [Car(brand_id=listing['brand_id'], model_id=listing['model_id'], description=f'Car {i}',
+                    fuel_type='gas', transmission='auto', mileage=1000 + i, price=5000 + i,
+                    seller_id=listing['seller_id']) for i in range(count)]
+        db.add_all(cars)
+        await db.flush()
+        db.add_all([CarImage(car_id=car.id, car_image=f'http://example.com/{car.id}/{i}.jpg')
+                    for car in cars for i in range(images_per_car)])
+        await db.commit()
+        return [car.id for car in cars]
+
+
+async def statements(client, url: str) -> int:
+    with profile() as request_profile:
+        response = await client.get(url)
+    assert response.status_code == 200
+    assert not request_profile.repeated(threshold=2)
+    return request_profile.statements
+
+
+@pytest.mark.parametrize('images_per_car', [0, 1, 6])
+async def test_car_list_runs_a_fixed_number_of_statements(client, sessions, listing, images_per_car):
+    await add_cars(sessions, listing, 30, images_per_car)
+    counts = {limit: await statements(client, f'/car/?limit={limit}') for limit in (1, 5, 25)}
+    assert set(counts.values()) == {2}
+    assert await statements(client, '/car/?limit=25&with_total=true') == QUERY_BUDGETS['GET /car/'] == 3
+
+
+@pytest.mark.parametrize('images_per_car', [0, 1, 12])
+async def test_car_detail_runs_a_fixed_number_of_statements(client, sessions, listing, images_per_car):
+    car_id, = await add_cars(sessions, listing, 1, images_per_car)
+    assert await statements(client, f'/car/{car_id}/') == QUERY_BUDGETS['GET /car/{car_id}/'] == 2
+    # served from the response cache now
+    assert await statements(client, f'/car/{car_id}/') == 0
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta
+from auction_app.api.auth import create_access_token, create_refresh_token
+from auction_app.db.models import Auction
+from auction_app.services import rate_limit
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(rate_limit, 'RATE_LIMIT_ENABLED', True)
+    rate_limit.blocked.clear()
+    rate_limit.auction_ends.clear()
+    yield
+    rate_limit.blocked.clear()
+    rate_limit.auction_ends.clear()
+
+
+async def hits(policy_name: str, key: str, times: int) -> list:
+    statuses = []
+    for _ in range(times):
+        try:
+            await rate_limit.hit(policy_name, key)
+            statuses.append(200)
+        except HTTPException as error:
+            statuses.append(error.status_code)
+    return statuses
+
+
+async def test_bucket_allows_a_burst_then_denies():
+    assert await hits('login', 'ip:1', 4) == [200, 200, 200, 429]
+
+
+async def test_denial_says_when_to_retry():
+    await hits('login', 'ip:1', 3)
+    with pytest.raises(HTTPException) as error:
+        await rate_limit.hit('login', 'ip:1')
+    # 3 tokens per 5 seconds, the next one is about 1.7 seconds away
+    assert error.value.headers['Retry-After'] == '2'
+
+
+async def test_bucket_refills(monkeypatch):
+    monkeypatch.setitem(rate_limit.POLICIES, 'login', rate_limit.Policy(2, 0.2))
+    assert await hits('login', 'ip:1', 3) == [200, 200, 429]
+    await asyncio.sleep(0.15)
+    assert await hits('login', 'ip:1', 1) == [200]
+
+
+async def test_blocked_bucket_is_answered_without_redis(monkeypatch):
+    await hits('login', 'ip:1', 3)
+    assert await hits('login', 'ip:1', 1) == [429]
+
+    async def unreachable(**kwargs):
+        raise AssertionError('asked redis')
+
+    monkeypatch.setattr(rate_limit, 'TOKEN_BUCKET', unreachable)
+    assert await hits('login', 'ip:1', 1) == [429]
+
+
+async def test_each_identity_has_its_own_bucket():
+    assert await hits('login', 'ip:1', 4) == [200, 200, 200, 429]
+    assert await hits('login', 'ip:2', 1) == [200]
+    assert await hits('login', 'user:alice', 1) == [200]
+    # and each policy its own
+    assert await hits('register', 'ip:1', 1) == [200]
+
+
+def connection(authorization: str = None) -> HTTPConnection:
+    headers = [(b'authorization', authorization.encode())] if authorization else []
+    return HTTPConnection({'type': 'http', 'headers': headers, 'client': ('10.0.0.1', 1234)})
+
+
+def test_identity_is_the_user_behind_an_access_token():
+    assert rate_limit.identity(connection()) == 'ip:10.0.0.1'
+    assert rate_limit.identity(connection(f"Bearer {create_access_token({'sub': 'alice'})}")) == 'user:alice'
+    assert rate_limit.identity(connection(f"Bearer {create_refresh_token({'sub': 'alice'})}")) == 'ip:10.0.0.1'
+    assert rate_limit.identity(connection('Bearer forged')) == 'ip:10.0.0.1'
+
+
+async def test_login_route_is_limited(client):
+    statuses = [(await client.post('/auth/login/', params={'email': 'nobody@example.com', 'password': 'x'}))
+                for _ in range(4)]
+    assert [response.status_code for response in statuses] == [404, 404, 404, 429]
+    assert int(statuses[-1].headers['Retry-After']) >= 1
+
+
+async def test_bulk_import_is_limited(client):
+    statuses = [(await client.post('/bulk/car/', content=b'')).status_code for _ in range(3)]
+    assert statuses[-1] == 429
+    assert 429 not in statuses[:-1]
+
+
+async def test_closing_bids_draw_from_a_per_auction_budget(sessions, listing):
+    buyer_id, auction_id = listing['buyer_ids'][0], listing['auction_id']
+
+    async def bids(times: int) -> list:
+        statuses = []
+        async with sessions() as db:
+            for _ in range(times):
+                try:
+                    await rate_limit.limit_bid(db, buyer_id, auction_id)
+                    statuses.append(200)
+                except HTTPException as error:
+                    statuses.append(error.status_code)
+        return statuses
+
+    # an hour to go: the buyer's plain budget, 10 bids
+    assert await bids(11) == [200] * 10 + [429]
+
+    async with sessions() as db:
+        auction = await db.get(Auction, auction_id)
+        auction.end_time = datetime.utcnow() + timedelta(seconds=30)
+        await db.commit()
+    rate_limit.auction_ends.clear()
+    rate_limit.blocked.clear()
+    assert await bids(31) == [200] * 30 + [429]
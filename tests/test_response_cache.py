@@ -0,0 +1,35 @@
+from auction_app.db.models import Car
+from auction_app.services import car_facets, response_cache
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_store_never_goes_back_a_version():
+    key = response_cache.car_key(1)
+    await response_cache.store(key, 2, 'v2', b'{}', response_cache.REVALIDATE, 60)
+    await response_cache.store(key, 1, 'v1', b'{}', response_cache.REVALIDATE, 60)
+    assert (await response_cache.cached(key))['etag'] == 'v2'
+
+
+async def test_invalidated_entry_is_not_refilled_by_a_stale_read():
+    key = response_cache.car_key(1)
+    await response_cache.forget_cars([1])
+    # a read that loaded the row before the write committed
+    await response_cache.store(key, 1, 'v1', b'{}', response_cache.REVALIDATE, 60)
+    assert await response_cache.cached(key) is None
+
+
+async def test_user_delete_forgets_cascaded_cars_and_auctions(client, sessions, listing):
+    async with sessions() as db:
+        await car_facets.added([await db.get(Car, listing['car_id'])])
+    for url in ('/car/{car_id}/', '/auction/{auction_id}/'):
+        assert (await client.get(url.format(**listing))).status_code == 200
+    assert await response_cache.cached(response_cache.car_key(listing['car_id']))
+
+    assert (await client.delete(f"/user/{listing['seller_id']}/")).status_code == 200
+    for url in ('/car/{car_id}/', '/auction/{auction_id}/'):
+        assert (await client.get(url.format(**listing))).status_code == 404
+    facets = await car_facets.facets()
+    assert not any(facets[name] for name in car_facets.FIELDS)
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from auction_app.db.models import Auction, AuctionStatus
+from auction_app.services import scheduler
+import pytest
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def auctions(sessions, listing):
+    # next to the listing's running auction: one about to start and two
+    # that ran out, one above its reserve and one below
+    now = datetime.utcnow()
+    buyer_id = listing['buyer_ids'][0]
+    async with sessions() as db:
+        rows = {
+            'starting': Auction(car_id=listing['car_id'], start_price=100, start_time=now - timedelta(seconds=1),
+                                end_time=now + timedelta(hours=1), status=AuctionStatus.waiting),
+            'waiting': Auction(car_id=listing['car_id'], start_price=100, start_time=now + timedelta(hours=1),
+                               end_time=now + timedelta(hours=2), status=AuctionStatus.waiting),
+            'reserve_met': Auction(car_id=listing['car_id'], start_price=100, min_price=500,
+                                   start_time=now - timedelta(hours=2), end_time=now - timedelta(seconds=1),
+                                   status=AuctionStatus.started, current_price=500, current_winner_id=buyer_id),
+            'below_reserve': Auction(car_id=listing['car_id'], start_price=100, min_price=500,
+                                     start_time=now - timedelta(hours=2), end_time=now - timedelta(seconds=1),
+                                     status=AuctionStatus.started, current_price=499.99,
+                                     current_winner_id=buyer_id),
+            'no_bids': Auction(car_id=listing['car_id'], start_price=100, start_time=now - timedelta(hours=2),
+                               end_time=now - timedelta(seconds=1), status=AuctionStatus.started),
+        }
+        db.add_all(rows.values())
+        await db.commit()
+        return {name: auction.id for name, auction in rows.items()}
+
+
+async def states(sessions, ids: dict) -> dict:
+    async with sessions() as db:
+        return {name: ((auction := await db.get(Auction, auction_id)).status, auction.winner_id)
+                for name, auction_id in ids.items()}
+
+
+async def test_transition_starts_and_settles_due_auctions(sessions, listing, auctions):
+    async with sessions() as db:
+        started, completed = await scheduler._transition(db, datetime.utcnow())
+        await db.commit()
+
+    buyer_id = listing['buyer_ids'][0]
+    assert started == [auctions['starting']]
+    assert sorted(completed) == sorted([(auctions['reserve_met'], buyer_id, 500),
+                                        (auctions['below_reserve'], None, Decimal('499.99')),
+                                        (auctions['no_bids'], None, None)])
+    assert await states(sessions, {**auctions, 'running': listing['auction_id']}) == {
+        'starting': (AuctionStatus.started, None),
+        'waiting': (AuctionStatus.waiting, None),
+        'reserve_met': (AuctionStatus.completed, buyer_id),
+        'below_reserve': (AuctionStatus.completed, None),
+        'no_bids': (AuctionStatus.completed, None),
+        'running': (AuctionStatus.started, None),
+    }
+
+
+async def test_tick_needs_the_lock(sessions, auctions, monkeypatch):
+    async def taken(db, key):
+        return False
+
+    monkeypatch.setattr(scheduler, 'try_lock', taken)
+    await scheduler.tick()
+    assert (await states(sessions, auctions))['starting'] == (AuctionStatus.waiting, None)
+
+
+async def test_tick_settles_and_announces(sessions, listing, auctions, monkeypatch):
+    async def locked(db, key):
+        return True
+
+    published = []
+
+    async def publish_many(events):
+        published.extend(events)
+
+    monkeypatch.setattr(scheduler, 'try_lock', locked)
+    monkeypatch.setattr(scheduler.live_feed, 'publish_many', publish_many)
+    await scheduler.tick()
+
+    assert (await states(sessions, auctions))['reserve_met'] == (AuctionStatus.completed, listing['buyer_ids'][0])
+    assert dict(published)[auctions['below_reserve']] == {'type': 'status', 'status': 'completed',
+                                                          'winner_id': None, 'final_price': 499.99}
+    assert dict(published)[auctions['starting']] == {'type': 'status', 'status': 'started'}